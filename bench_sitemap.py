@@ -0,0 +1,239 @@
+'''  bench_sitemap.py
+
+ Benchmark for the sitemap page processing, using synthetic XML backups
+
+ Generates an XML file in the form of a MediaWiki backup with the requested number of pages
+ (person, profile, place, organisation and top level pages in namespaces 3000, 3002, 3004, 3008
+ and 0, with categories, File: and Media: references, internal links - some of them broken -
+ and <pre>/<nowiki> sections), then times each phase of the sitemap processing on it. The pages
+ are read and processed one at a time, as sitemap.py does, so only the sitemap entries are kept
+ in memory; the time of each phase is added up over the pages:
+   index        build the page index (wiki_dump.build_page_index)
+   parse        read each page from the XML file (wiki_dump.iter_pages)
+   scan         scan each page for categories, links, media files etc. (page_scan.scan_page)
+   link_check   build the page title lookup table and look up the links of each page
+   process      produce the sitemap entries from the page records, with the links already
+                looked up, and find the bad links (sitemap_pages.process_page)
+   sort         sort the sitemap lists
+   render       render the wiki table, spreadsheet and pages list (sitemap_render.py)
+
+ The results are written as JSON (to the screen, or to a file with --output): for each size,
+ the number of pages and bytes, and for each phase the time taken and pages per second, and the
+ peak memory (resident set size). Each size is run in a new process, so the peak memory is that
+ of the run for that size only (the peak is kept for the life of a process). Keep the JSON from
+ each run to compare runs.
+
+ Usage:
+   python bench_sitemap.py                       # 1000, 10000 and 100000 pages
+   python bench_sitemap.py 5000 --output bench.json --seed 2
+
+'''
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import multiprocessing
+from xml.sax.saxutils import escape
+from wiki_dump import build_page_index, iter_pages
+from wiki_names import title_lookup, CategoryRank
+from page_scan import scan_page
+from sitemap_pages import init_pages, process_page, link_targets
+from sitemap_render import render_sitemap, states
+
+try:
+  import resource                   # not available on Windows
+except ImportError:
+  resource = None
+
+default_sizes = [1000, 10000, 100000]
+
+surnames = ["Smith", "Jones", "O'Brien", "Brown", "Zed", "apple", "Évans", "Wilson", "Taylor", "Hall", "Nguyen", "McDonald"]
+forenames = ["John", "Mary", "Ann Lee", "Peter", "Jo"]
+bench_categories = states + ["Engineers", "Bridges", "Railways", "Water supply", "Mining", "Heritage"]
+media_names = ["Photo one.jpg", "photo_2.png", "A%20b.jpg", "Doc &amp; co.pdf", "It%27s.jpg"]
+
+
+#=====================================================================================================
+#
+# function to make up the title and namespace of page number i of a synthetic backup
+#
+def bench_title(i, rnd):
+  kind = i % 10
+  if kind == 0 or kind == 1:
+    title = "Person:" + rnd.choice(forenames) + " " + rnd.choice(surnames) + str(i)
+    if rnd.random() < 0.5:
+      title = "Person:" + rnd.choice(surnames) + str(i) + ", " + rnd.choice(forenames)
+    return (title, "3000")
+  if kind == 2:
+    return ("Profile:" + rnd.choice(forenames) + " " + rnd.choice(surnames) + str(i), "3002")
+  if kind == 3:
+    return ("Organisation:" + rnd.choice(surnames) + " Works " + str(i), "3008")
+  if kind == 4:
+    return ("Place:" + rnd.choice(surnames) + "ville " + str(i), "3004")
+  if i % 20 == 5:
+    return (rnd.choice(["Help:Editing", "Sitemap", "Main:Intro", "Css:Style"]) + str(i), "0")
+  return (rnd.choice(surnames) + " Bridge " + str(i), "0")
+
+
+#=====================================================================================================
+#
+# function to make up the wiki text of a page of a synthetic backup
+#
+def bench_text(title, namespace, titles, rnd):
+  parts = []
+  if namespace in ["3000", "3002", "3008"] and rnd.random() < 0.8:
+    parts += ["'''" + title + "''' (" + str(rnd.randint(1800, 1900)) + " - " + rnd.choice(["1950", "----"]) + ") was notable."]
+  for n in range(rnd.randint(0, 6)):
+    target = rnd.choice(titles)[0]
+    if rnd.random() < 0.1:
+      target = target.replace(" ", "_")
+    elif rnd.random() < 0.1:
+      target = "Missing page " + str(rnd.randint(0, 50))
+    parts += ["See [[" + target + "|here]] and more."]
+  for n in range(rnd.randint(0, 3)):
+    parts += ["[[" + rnd.choice(["File:", "File: ", "file:"]) + rnd.choice(media_names + ["img" + str(rnd.randint(0, 300)) + ".jpg"]) + "|thumb|caption]]"]
+  if rnd.random() < 0.3:
+    parts += ["[[Media:Report" + str(rnd.randint(0, 50)) + ".pdf|report]]"]
+  if rnd.random() < 0.1:
+    parts += ["<gallery>\nFile:Gallery" + str(rnd.randint(0, 50)) + ".jpg|caption\n</gallery>"]
+  if rnd.random() < 0.1:
+    parts += ["<pre>[[Category:Hidden]] [[Nowhere page]] [[File:Hidden.jpg|x]]</pre>"]
+  if rnd.random() < 0.1:
+    parts += ["<nowiki>[[Nope link]]</nowiki>"]
+  for n in range(rnd.randint(0, 4)):
+    parts += ["[[Category:" + rnd.choice(bench_categories) + "]]"]
+  if rnd.random() < 0.05:
+    parts = ["#REDIRECT [[" + rnd.choice(titles)[0] + "]]"]
+  return "\n".join(parts)
+
+
+#=====================================================================================================
+#
+# function to write a synthetic XML backup with n_pages pages
+#
+def make_dump(file_name, n_pages, seed = 1):
+  rnd = random.Random(seed)
+  titles = [bench_title(i, rnd) for i in range(n_pages)]
+  with open(file_name, 'w', encoding="utf-8") as xml_file:
+    xml_file.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="en">\n')
+    xml_file.write('  <siteinfo>\n    <sitename>Benchmark</sitename>\n  </siteinfo>\n')
+    for i, (title, namespace) in enumerate(titles):
+      text = bench_text(title, namespace, titles, rnd)
+      sha1 = hashlib.sha1(text.encode('utf-8')).hexdigest()
+      timestamp = "20" + str(rnd.randint(10, 24)) + "-" + "{:02d}".format(rnd.randint(1, 12)) + "-" + "{:02d}".format(rnd.randint(1, 28)) + "T10:00:00Z"
+      xml_file.write("  <page>\n    <title>" + escape(title) + "</title>\n    <ns>" + namespace + "</ns>\n    <id>" + str(i + 1) + "</id>\n"
+                     "    <revision>\n      <id>" + str(1000 + i) + "</id>\n      <timestamp>" + timestamp + "</timestamp>\n"
+                     "      <text bytes=\"" + str(len(text)) + "\" xml:space=\"preserve\">" + escape(text, {'"': "&quot;"}) + "</text>\n"
+                     "      <sha1>" + sha1 + "</sha1>\n    </revision>\n  </page>\n")
+    xml_file.write("</mediawiki>\n")
+
+
+#=====================================================================================================
+#
+# function to return the peak resident set size of this process in bytes (None if not known)
+# - the highest since the process started
+#
+def peak_rss():
+  if resource == None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == "darwin":      # bytes on macOS, kilobytes elsewhere
+    return peak
+  return peak * 1024
+
+
+#=====================================================================================================
+#
+# function to time each phase of the sitemap processing on an XML file
+#
+# The pages are streamed through the parse, scan, link_check and process phases one at a time,
+# and the time of each step is added to its phase.
+#
+def run_benchmark(file_name, categories):
+  phases = {}
+  for name in ["index", "parse", "scan", "link_check", "process", "sort", "render"]:
+    phases[name] = {"seconds": 0.0}
+  clock = [time.perf_counter()]
+  def lap(name):                    # time since the last lap is added to phase name
+    now = time.perf_counter()
+    phases[name]["seconds"] += now - clock[0]
+    clock[0] = now
+
+  index = build_page_index(file_name)
+  lap("index")
+
+  page_lookup = title_lookup([entry[0] for entry in index])
+  index = None
+  init_pages(CategoryRank(categories), page_lookup)
+  lap("link_check")
+
+  n_pages = 0
+  n_bad_links = 0
+  lists = {"ppages": [], "opages": [], "plpages": [], "mpages": []}
+  for page_text in iter_pages(file_name):
+    lap("parse")
+    n_pages += 1
+    record = scan_page(page_text)
+    lap("scan")
+    targets = link_targets(record["links"], page_lookup)
+    lap("link_check")
+    result = process_page((page_text, "", record), targets)   # record and targets given - not scanned or looked up again
+    n_bad_links += result["counts"]["bad_links"]
+    if result["list"] != "":
+      lists[result["list"]] += [result["entry"]]
+    lap("process")
+  lap("parse")                      # end of the XML file
+
+  for entries in lists.values():
+    entries.sort(key = lambda entry: entry.sort_key)
+  lap("sort")
+
+  sitemap = render_sitemap(file_name, "https://example.org/wiki/", lists["mpages"], lists["ppages"], lists["opages"], lists["plpages"], [])
+  lap("render")
+
+  for name in phases:
+    seconds = phases[name]["seconds"]
+    phases[name]["pages_per_second"] = round(n_pages / seconds, 1) if seconds > 0 else None
+    phases[name]["seconds"] = round(seconds, 4)
+  total = sum([phases[name]["seconds"] for name in phases])
+  return {"pages": n_pages, "bytes": os.path.getsize(file_name), "bad_links": n_bad_links,
+          "sitemap_bytes": len(sitemap["wiki"]), "phases": phases, "total_seconds": round(total, 4),
+          "pages_per_second": round(n_pages / total, 1) if total > 0 else None, "peak_rss": peak_rss()}
+
+
+#=====================================================================================================
+#
+# main code - benchmark each size in turn and write the results as JSON
+#
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = "Benchmark sitemap page processing on synthetic XML backups")
+  parser.add_argument("sizes", nargs = "*", type = int, default = default_sizes, help = "numbers of pages")
+  parser.add_argument("--seed", type = int, default = 1, help = "random seed for the synthetic backups")
+  parser.add_argument("--output", help = "JSON results file (default: print the results)")
+  parser.add_argument("--keep", action = "store_true", help = "keep the generated XML files")
+  args = parser.parse_args()
+
+  bench_folder = tempfile.mkdtemp(prefix = "bench_sitemap_")
+  report = {"python": sys.version.split()[0], "seed": args.seed, "runs": []}
+  for n_pages in args.sizes:
+    file_name = os.path.join(bench_folder, "bench_" + str(n_pages) + ".xml")
+    make_dump(file_name, n_pages, args.seed)
+    # a new process for each size - the peak memory of a process is never reset
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+      run = pool.apply(run_benchmark, (file_name, bench_categories))
+    report["runs"] += [run]
+    print(str(n_pages) + " pages: " + "{:.2f}".format(run["total_seconds"]) + " s (" + str(run["pages_per_second"]) + " pages/s)", file = sys.stderr)
+    if not args.keep:
+      os.remove(file_name)
+  if not args.keep:
+    os.rmdir(bench_folder)
+
+  if args.output:
+    with open(args.output, 'w', encoding="utf-8") as report_file:
+      json.dump(report, report_file, indent = 2)
+  else:
+    print(json.dumps(report, indent = 2))
@@ -40,6 +40,7 @@
 import os
 import re 
 from urllib.parse import unquote
+from wiki_names import url_title, straight_apostrophes
 import pywikibot
 
 import colorama
@@ -778,7 +779,7 @@ def display_edited_text(editing):
 
 import time
 def evaluate_links(editing, linklist, scan_page_link):
-  sc_pg_link = re.sub(" ","_",scan_page_link)
+  sc_pg_link = url_title(scan_page_link)
   quit = False
   
 #  nbefore = 40
@@ -844,7 +845,7 @@ def evaluate_links(editing, linklist, scan_page_link):
       print_normal_text_at(1,y1,"Scanning page: " + display_items[0] + " (" + display_items[1] + ") [" + site_URL + sc_pg_link + "]")
       print_normal_text_at(1,y1+1,display_items[2])
       print_normal_text_at(3,y1+3,display_items[3])
-      pg_link = re.sub(" ","_",pagelink)
+      pg_link = url_title(pagelink)
       print_green_text_at(1,y2,"Suggest link at " + str(position) + "%: " + pagelink + "  (" + display_items[5] + ") [" + site_URL + pg_link + "]")
       print_green_text_at(1,y2+1,display_items[6])
       print_normal_text_at(3,y2+3,display_items[7])
@@ -1023,7 +1024,7 @@ def suggested_links_list(pagetext, page_items, pages_list):
    editing.reset(pagetext)
    editing = clean_wikitext(pagetext, editing) # generate clean version of text
    cleantext = editing.n_string()
-   cleantext = re.sub("’","'",cleantext)       # clean up curly apostrophies
+   cleantext = straight_apostrophes(cleantext)       # clean up curly apostrophies
    outfile.write("\n\n== Clean Wikitext ==\n" + editing.n_string() + "\n= = = = = = = \n\n")  
    
    links_created = []
@@ -1129,7 +1130,7 @@ def suggested_links_list(pagetext, page_items, pages_list):
                  
        #print("search for: " + name)
      
-       match_name = re.sub("’","'",match_name)  # clean up curly apostrophies
+       match_name = straight_apostrophes(match_name)  # clean up curly apostrophies
        #outfile.write("Matching " + match_name + "\n")
 
        found = True
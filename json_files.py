@@ -0,0 +1,71 @@
+'''  json_files.py
+
+ Functions for the files kept in the working directory from one run to the next (page cache,
+ media folder and hash caches, media usage index, search index and link graph)
+
+ Each file holds a JSON dictionary with a "version" item. A file of another version, or one
+ which cannot be read (damaged, e.g. by a disk filling up), is treated as if it were missing,
+ so that the data is built again. Files are written to a temporary file (the file name with
+ ".tmp" added) which replaces the old file only when it is complete, so an interrupted run
+ never leaves a partly written file.
+
+ Usage:
+   saved = load_versioned_json(file_name, version)     # None if missing, damaged or another version
+   save_json_atomic(file_name, {"version": version, ...})
+
+ parse_versioned_json and atomic_open are the same for files which hold more than a JSON
+ dictionary (see link_graph.py).
+
+'''
+import os
+import json
+from contextlib import contextmanager
+
+
+#=====================================================================================================
+#
+# function to read a JSON dictionary from text (str or UTF-8 bytes) - returns the dictionary, or
+# None if the text is not JSON or the "version" item is not version
+#
+def parse_versioned_json(text, version):
+  try:
+    saved = json.loads(text)
+  except ValueError:                        # damaged file
+    return None
+  if not isinstance(saved, dict) or saved.get("version") != version:
+    return None
+  return saved
+
+
+#=====================================================================================================
+#
+# function to load a JSON file saved by save_json_atomic - returns the dictionary, or None if
+# there is no such file, it cannot be read, or it is not of this version
+#
+def load_versioned_json(file_name, version):
+  if not os.path.exists(file_name):
+    return None
+  with open(file_name, 'rb') as json_file:
+    return parse_versioned_json(json_file.read(), version)
+
+
+#=====================================================================================================
+#
+# function to open a file for writing under a temporary name - the file replaces file_name when
+# the with block is completed (the old file is kept if the block raises an exception)
+#
+@contextmanager
+def atomic_open(file_name, mode = 'w'):
+  encoding = None if 'b' in mode else "utf-8"
+  with open(file_name + ".tmp", mode, encoding = encoding) as temp_file:
+    yield temp_file
+  os.replace(file_name + ".tmp", file_name)
+
+
+#=====================================================================================================
+#
+# function to save a dictionary as a compact JSON file (non-ASCII characters kept as UTF-8)
+#
+def save_json_atomic(file_name, data):
+  with atomic_open(file_name) as json_file:
+    json.dump(data, json_file, ensure_ascii=False, separators=(',', ':'))
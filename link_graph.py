@@ -0,0 +1,185 @@
+'''  link_graph.py
+
+ Internal link graph of the site, built by sitemap.py while the pages are processed
+
+ Each page title is given a number (its position in the page names list), and the links are held
+ in compressed sparse row form: for page number p, the pages it links to are
+ targets[offsets[p]:offsets[p + 1]]. The same is kept for the reverse direction (the pages
+ linking to each page), so backlink counts, orphan pages (no links in), dead-end pages (no links
+ out) and the most linked pages come from the offsets arrays without reading the XML file again.
+ The arrays are array.array of integers - a few bytes per link.
+
+ Links are counted once per pair of pages, and links from a page to itself are ignored.
+
+ Usage:
+   graph = LinkGraph(titles)
+   graph.add_links(title, target titles)    # for each page, in any order
+   graph.finish()
+   graph.save(file_name)
+   write_link_report(report file name, graph, titles to report)
+
+ Graph file: one line of JSON {"version", "typecode", "byteorder", "titles", "edges"},
+ then the offsets and targets arrays of the links out, as raw bytes.
+
+'''
+import sys
+import json
+import heapq
+from array import array
+from json_files import parse_versioned_json, atomic_open
+
+graph_version = "1"
+most_linked_count = 50       # pages listed in the most linked section of the link report
+
+
+#=====================================================================================================
+#
+# function to convert pairs of page numbers into compressed sparse row arrays - returns
+# (offsets, targets). The targets of each row are in the order of the pairs.
+#
+def csr_arrays(n_pages, sources, targets):
+  offsets = array('i', [0]) * (n_pages + 1)
+  for source in sources:
+    offsets[source + 1] += 1
+  for p in range(n_pages):
+    offsets[p + 1] += offsets[p]
+  row_targets = array('i', [0]) * len(targets)
+  position = array('i', offsets[:n_pages])
+  for source, target in zip(sources, targets):
+    row_targets[position[source]] = target
+    position[source] += 1
+  return (offsets, row_targets)
+
+
+#=====================================================================================================
+#
+# LinkGraph class
+#
+class LinkGraph:
+  def __init__(self, titles, links = None):
+    self.__titles = []
+    self.__numbers = {}               # title => page number
+    for title in titles:
+      if title not in self.__numbers:
+        self.__numbers[title] = len(self.__titles)
+        self.__titles += [title]
+    self.__pairs = set()              # (source, target) page numbers, until finish() is called
+    if links == None:
+      links = (array('i', [0]) * (len(self.__titles) + 1), array('i'))
+    self.__set_links(*links)
+
+  def __set_links(self, offsets, targets):
+    sources = array('i')
+    for p in range(len(self.__titles)):
+      sources.extend(array('i', [p]) * (offsets[p + 1] - offsets[p]))
+    self.__out = (offsets, targets)
+    self.__in = csr_arrays(len(self.__titles), targets, sources)
+
+  def add_links(self, title, targets):
+    source = self.__numbers.get(title)
+    if source == None:
+      return
+    for target_title in targets:
+      target = self.__numbers.get(target_title)
+      if target != None and target != source:
+        self.__pairs.add((source, target))
+
+  def finish(self):
+    pairs = sorted(self.__pairs)      # rows of both arrays in page number order
+    self.__pairs = set()
+    sources = array('i', [pair[0] for pair in pairs])
+    targets = array('i', [pair[1] for pair in pairs])
+    self.__set_links(*csr_arrays(len(self.__titles), sources, targets))
+
+  def __len__(self):
+    return len(self.__titles)
+
+  def edges(self):
+    return len(self.__out[1])
+
+  def title(self, number):
+    return self.__titles[number]
+
+  def number(self, title):
+    return self.__numbers.get(title)
+
+  def links_out(self, title):
+    offsets, targets = self.__out
+    p = self.__numbers[title]
+    return [self.__titles[target] for target in targets[offsets[p]:offsets[p + 1]]]
+
+  def links_in(self, title):
+    offsets, sources = self.__in
+    p = self.__numbers[title]
+    return [self.__titles[source] for source in sources[offsets[p]:offsets[p + 1]]]
+
+  def out_degrees(self):
+    offsets = self.__out[0]
+    return array('i', [offsets[p + 1] - offsets[p] for p in range(len(self.__titles))])
+
+  def in_degrees(self):
+    offsets = self.__in[0]
+    return array('i', [offsets[p + 1] - offsets[p] for p in range(len(self.__titles))])
+
+  def save(self, file_name):
+    offsets, targets = self.__out
+    header = {"version": graph_version, "typecode": offsets.typecode, "byteorder": sys.byteorder,
+              "titles": self.__titles, "edges": len(targets)}
+    with atomic_open(file_name, 'wb') as graph_file:
+      graph_file.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b"\n")
+      offsets.tofile(graph_file)
+      targets.tofile(graph_file)
+
+
+#=====================================================================================================
+#
+# function to load a graph saved by LinkGraph.save - returns a LinkGraph, or None if the file is
+# not a graph file of this version
+#
+def load_link_graph(file_name):
+  with open(file_name, 'rb') as graph_file:
+    header = parse_versioned_json(graph_file.readline(), graph_version)
+    if header == None:
+      return None
+    offsets = array(header["typecode"])
+    offsets.fromfile(graph_file, len(header["titles"]) + 1)
+    targets = array(header["typecode"])
+    targets.fromfile(graph_file, header["edges"])
+  if header["byteorder"] != sys.byteorder:
+    offsets.byteswap()
+    targets.byteswap()
+  return LinkGraph(header["titles"], (offsets, targets))
+
+
+#=====================================================================================================
+#
+# function to write the link report - the most linked pages, then the orphan and dead-end pages
+# among report_titles (e.g. the pages in the sitemap; other namespaces are not of interest)
+#
+def write_link_report(file_name, graph, report_titles):
+  in_degrees = graph.in_degrees()
+  out_degrees = graph.out_degrees()
+  numbers = []
+  for title in report_titles:
+    p = graph.number(title)
+    if p != None:
+      numbers += [p]
+  orphans = [graph.title(p) for p in numbers if in_degrees[p] == 0]
+  dead_ends = [graph.title(p) for p in numbers if out_degrees[p] == 0]
+  most_linked = heapq.nlargest(most_linked_count, range(len(graph)), key = lambda p: in_degrees[p])
+
+  with open(file_name, 'w', encoding="utf-8") as report_file:
+    report_file.write("Link graph: " + str(len(graph)) + " pages, " + str(graph.edges()) + " links between pages\n")
+    report_file.write(str(len(numbers)) + " pages reported: " + str(len(orphans)) + " orphan pages (no links in), " +
+                      str(len(dead_ends)) + " dead-end pages (no links out)\n")
+    report_file.write("\n==Most linked pages==\n")
+    for p in most_linked:
+      if in_degrees[p] > 0:
+        report_file.write(str(in_degrees[p]) + "\t" + graph.title(p) + "\n")
+    report_file.write("\n==Orphan pages==\n")
+    for title in orphans:
+      report_file.write(title + "\n")
+    report_file.write("\n==Dead-end pages==\n")
+    for title in dead_ends:
+      report_file.write(title + "\n")
+  return (orphans, dead_ends)
@@ -0,0 +1,147 @@
+'''  media_audit.py
+
+ Audit of the local media folders for files with the same content under different names
+
+ The same image is often saved more than once under names which differ only in spaces,
+ underscores or %20 / %27 codes. hash_files calculates a SHA-256 hash of the content of every
+ file, reading each file in chunks, in a pool of threads. Hashes are kept in a hash cache file
+ with the size and modification time of each file, and a file is only read again if its size
+ or modification time has changed, so a repeated audit is almost instant. The size and
+ modification time are read from the file itself (os.stat), not from the cached folder listing
+ of media_inventory.scan_media_folders, which is only refreshed when a folder changes - a file
+ edited in place does not change its folder.
+
+ duplicate_groups returns the groups of files with the same content, and write_audit writes a
+ report of the groups, with the wiki pages referring to each copy.
+
+ Hash cache file (JSON):
+   {"version": hash_cache_version, "files": {path: [size, mtime ns, hash]}}
+
+'''
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from media_inventory import media_key
+from json_files import load_versioned_json, save_json_atomic
+
+hash_cache_version = "1"
+hash_chunk_size = 1048576    # bytes read from a file at a time
+
+
+#=====================================================================================================
+#
+# function to calculate hashes of the content of a file in one pass - returns the hex digests,
+# in the order of names (hashlib algorithm names, e.g. ("sha256", "md5") for media_store.py)
+#
+def file_hashes(path, names = ("sha256",)):
+  digests = [hashlib.new(name) for name in names]
+  with open(path, 'rb') as media_file:
+    while True:
+      chunk = media_file.read(hash_chunk_size)
+      if not chunk:
+        break
+      for digest in digests:
+        digest.update(chunk)
+  return tuple(digest.hexdigest() for digest in digests)
+
+
+#=====================================================================================================
+#
+# function to calculate the SHA-256 hash of the content of a file
+#
+def file_hash(path):
+  return file_hashes(path)[0]
+
+
+#=====================================================================================================
+#
+# function to return the content hash of each file - dictionary: path => hash
+#
+# paths is a list of file paths. Files which cannot be read are left out.
+#
+def hash_files(paths, cache_file_name = None, workers = 8):
+  cache = {}
+  if cache_file_name != None:
+    saved = load_versioned_json(cache_file_name, hash_cache_version)
+    if saved != None:                       # otherwise hash everything
+      cache = saved.get("files", {})
+
+  hashes = {}
+  new_cache = {}
+  to_hash = []
+  for path in paths:
+    try:
+      file_stat = os.stat(path)
+    except OSError:                         # file removed
+      continue
+    size = file_stat.st_size
+    mtime = file_stat.st_mtime_ns
+    entry = cache.get(path)
+    if entry != None and entry[0] == size and entry[1] == mtime:
+      hashes[path] = entry[2]
+      new_cache[path] = entry
+    else:
+      to_hash += [(path, size, mtime)]
+
+  def hash_one(item):
+    try:
+      return file_hash(item[0])
+    except OSError:                         # file removed or not readable
+      return None
+
+  if len(to_hash) > 0:
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+      for (path, size, mtime), digest in zip(to_hash, pool.map(hash_one, to_hash)):
+        if digest != None:
+          hashes[path] = digest
+          new_cache[path] = [size, mtime, digest]
+
+  if cache_file_name != None:
+    save_json_atomic(cache_file_name, {"version": hash_cache_version, "files": new_cache})
+  return hashes
+
+
+#=====================================================================================================
+#
+# function to return groups of files with the same content - list of lists of paths, largest
+# groups first
+#
+def duplicate_groups(hashes):
+  by_hash = {}
+  for path, digest in hashes.items():
+    if digest not in by_hash:
+      by_hash[digest] = []
+    by_hash[digest] += [path]
+  groups = [sorted(paths) for paths in by_hash.values() if len(paths) > 1]
+  groups.sort(key = lambda paths: (-len(paths), paths[0]))
+  return groups
+
+
+#=====================================================================================================
+#
+# function to write the duplicate files report
+#
+# references is a dictionary: media_key (see media_inventory.py) => list of page titles referring
+# to that file. Returns the number of bytes which removing the extra copies would free.
+#
+def write_audit(file_name, groups, hashes, references):
+  lines = []
+  n_files = 0
+  spare_bytes = 0
+  for paths in groups:
+    size = os.path.getsize(paths[0]) if os.path.exists(paths[0]) else 0
+    n_files += len(paths)
+    spare_bytes += size * (len(paths) - 1)
+    lines += ["\n" + hashes[paths[0]][:16] + "  " + str(size) + " bytes, " + str(len(paths)) + " copies\n"]
+    for path in paths:
+      pages = references.get(media_key(os.path.basename(path)), [])
+      if len(pages) > 0:
+        lines += ["  " + path + "  used in: " + "; ".join(pages) + "\n"]
+      else:
+        lines += ["  " + path + "  not referenced\n"]
+
+  with open(file_name, 'w', encoding="utf-8") as audit_file:
+    audit_file.write("Media audit: " + str(len(hashes)) + " files, " + str(len(groups)) + " groups of duplicates (" +
+                     str(n_files) + " files), " + str(spare_bytes) + " bytes in extra copies\n")
+    audit_file.write("".join(lines))
+  return spare_bytes
@@ -0,0 +1,326 @@
+'''  media_download.py
+
+ Concurrent download of image and media files from the wiki media bucket
+
+ Files are downloaded by a bounded pool of worker threads sharing one requests session, so
+ that connections to the media server are pooled and re-used. The number of downloads in
+ progress from any one host is limited separately from the number of worker threads. The
+ downloader mounts a connection pool sized for its workers on the session, so each downloader
+ needs a session of its own (e.g. one for each site when several sites are processed at once).
+
+ Each file is first written to a temporary file ("<name>.part") in the download folder and
+ only renamed to its final name when the download is complete, so an interrupted run never
+ leaves a truncated file under the real file name.
+
+ A manifest (SQLite database in the download folder) records the URL, size, ETag,
+ Last-Modified date and local path of every file fetched. When the same file is requested
+ again:
+ - if the local file is complete, a conditional request (If-None-Match / If-Modified-Since)
+   is sent and the file is only fetched again if it has changed on the server
+ - if a .part file was left by an interrupted download, the rest of the file is requested
+   (Range / If-Range) and appended
+ - if the local file size differs from the size in the manifest (truncated or damaged), it
+   is fetched again
+ - a file downloaded before the manifest existed is checked with a HEAD request and recorded
+   in the manifest if its size matches
+ so a repeated run with downloads turned on is a cheap incremental sync.
+
+ With a shared media store (see media_store.py), a missing file is first checked with a HEAD
+ request: if the store already has content with the same ETag and size (the same image under
+ another name, or on another site), the file is linked from the store instead of downloaded.
+ Files which are downloaded are added to the store. A file linked to a blob of the store is
+ never written to in place: a truncated file is copied to a new .part file before the rest of
+ it is fetched, so that the blob (shared with the other names and sites using it) is unchanged.
+
+ Download results are collected while the workers run and written to the log file by finish(),
+ so that worker threads never write to the log file while the main loop is using it.
+
+ Usage:
+   downloader = MediaDownloader(wiki_url, download_path, session, log_file)
+   downloader.add(name, pagetitle)     # for each missing file - returns immediately
+   summary = downloader.finish()       # wait for all downloads, returns summary dictionary
+
+'''
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+chunk_size = 65536         # bytes written to file at a time
+progress_interval = 25     # print progress after this many completed downloads
+manifest_file_name = "media_manifest.db"     # manifest of downloaded files, kept in the download folder
+
+
+#=====================================================================================================
+#
+# MediaManifest class - record of downloaded files, shared by the download threads
+#
+# Entries are dictionaries with keys url, size, etag, last_modified, path and complete
+# (complete is False while a download is in progress or was interrupted). Each change is
+# committed immediately so the manifest survives an interrupted run.
+#
+class MediaManifest:
+  def __init__(self, file_name):
+    self.__lock = threading.Lock()
+    self.__db = sqlite3.connect(file_name, check_same_thread = False)
+    self.__db.execute("CREATE TABLE IF NOT EXISTS media (name TEXT PRIMARY KEY, url TEXT, size INTEGER, etag TEXT, last_modified TEXT, path TEXT, complete INTEGER)")
+    self.__db.commit()
+
+  def get(self, name):
+    with self.__lock:
+      row = self.__db.execute("SELECT url, size, etag, last_modified, path, complete FROM media WHERE name = ?", (name,)).fetchone()
+    if row == None:
+      return None
+    return {"url": row[0], "size": row[1], "etag": row[2], "last_modified": row[3], "path": row[4], "complete": row[5] == 1}
+
+  def set(self, name, entry):
+    with self.__lock:
+      self.__db.execute("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (name, entry["url"], entry["size"], entry["etag"], entry["last_modified"], entry["path"], 1 if entry["complete"] else 0))
+      self.__db.commit()
+
+  def close(self):
+    with self.__lock:
+      self.__db.close()
+
+
+#=====================================================================================================
+#
+# function to read a file size, or -1 if there is no such file
+#
+def file_size(file_location):
+  if os.path.exists(file_location):
+    return os.path.getsize(file_location)
+  return -1
+
+#=====================================================================================================
+#
+# function to get the full size of a file from a (partial) response, or -1 if not given
+#
+def response_size(response, offset):
+  if response.status_code == 206:
+    content_range = response.headers.get("Content-Range", "")   # bytes 1000-4999/5000
+    slash_p = content_range.rfind("/")
+    if slash_p >= 0 and content_range[slash_p + 1:].isdigit():
+      return int(content_range[slash_p + 1:])
+  length = response.headers.get("Content-Length")
+  if length != None and length.isdigit():
+    return int(length) + offset
+  return -1
+
+
+#=====================================================================================================
+#
+# MediaDownloader class
+#
+class MediaDownloader:
+  def __init__(self, base_url, download_path, session, log_file = None, workers = 8, host_limit = 4, timeout = 60, manifest = True,
+               store = None, site = ""):
+    self.__base_url = base_url                  # media bucket URL (with a slash at the end)
+    self.__download_path = download_path        # download folder (with a slash at the end)
+    self.__session = session
+    self.__log_file = log_file
+    self.__host_limit = host_limit
+    self.__timeout = timeout
+    self.__use_manifest = manifest
+    self.__manifest = None                      # opened when the first file is queued
+    self.__store = store                        # shared media store (media_store.py), or None
+    self.__site = site                          # site name for the media store
+    self.__host_slots = {}                      # host name => semaphore limiting downloads from that host
+    self.__lock = threading.Lock()              # protects counters, host_slots and log lines
+    self.__log_lines = []
+    self.__pool = None
+    self.__futures = []
+    self.__workers = workers
+    self.__queued = 0
+    self.__downloaded = 0
+    self.__resumed = 0
+    self.__unchanged = 0
+    self.__linked = 0
+    self.__failed = 0
+    self.__bytes = 0
+    self.__failures = []                        # (name, url, page title, reason)
+    self.__start_time = 0.0
+
+    # size the session connection pool to match the number of worker threads
+    adapter = HTTPAdapter(pool_connections = workers, pool_maxsize = workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+  def add(self, name, pagetitle):
+    if self.__pool == None:
+      if self.__use_manifest and self.__manifest == None:
+        self.__manifest = MediaManifest(self.__download_path + manifest_file_name)
+      self.__pool = ThreadPoolExecutor(max_workers = self.__workers)
+      self.__start_time = time.time()
+    self.__queued += 1
+    self.__futures += [self.__pool.submit(self.__download, name, pagetitle)]
+    return
+
+  def finish(self):
+    if self.__pool != None:
+      self.__pool.shutdown(wait = True)
+      self.__pool = None
+    for future in self.__futures:
+      future.result()                          # raise any unexpected error from a worker
+    self.__futures = []
+    if self.__manifest != None:
+      self.__manifest.close()
+      self.__manifest = None
+    summary = self.summary()
+    if self.__log_file != None:
+      self.__log_file.write("".join(self.__log_lines))
+      self.__log_file.write("Media downloads: " + str(summary["downloaded"]) + " downloaded (" + str(summary["resumed"]) + " resumed), " +
+                            str(summary["unchanged"]) + " unchanged, " + str(summary["linked"]) + " linked from the media store, " +
+                            str(summary["failed"]) + " failed of " + str(summary["queued"]) +
+                            " (" + str(summary["bytes"]) + " bytes in " + "{:.1f}".format(summary["seconds"]) + " s)\n")
+    self.__log_lines = []
+    print("\n" + str(summary["downloaded"]) + " media files downloaded, " + str(summary["unchanged"]) + " unchanged, " + str(summary["linked"]) + " linked from the media store, " +
+          str(summary["failed"]) + " could not be accessed")
+    return summary
+
+  def summary(self):
+    seconds = 0.0
+    if self.__start_time > 0:
+      seconds = time.time() - self.__start_time
+    return {"queued": self.__queued, "downloaded": self.__downloaded, "resumed": self.__resumed, "unchanged": self.__unchanged,
+            "linked": self.__linked, "failed": self.__failed, "bytes": self.__bytes, "seconds": seconds, "failures": list(self.__failures)}
+
+  def __log(self, text):
+    with self.__lock:
+      self.__log_lines += [text]
+
+  def __host_slot(self, url):
+    host = urlsplit(url).netloc
+    with self.__lock:
+      if host not in self.__host_slots:
+        self.__host_slots[host] = threading.BoundedSemaphore(self.__host_limit)
+      return self.__host_slots[host]
+
+  def __done(self, name, url, pagetitle, nbytes, outcome, reason):
+    with self.__lock:
+      if outcome == "failed":
+        self.__failed += 1
+        self.__failures += [(name, url, pagetitle, reason)]
+      elif outcome == "unchanged":
+        self.__unchanged += 1
+      elif outcome == "linked":
+        self.__linked += 1
+      else:
+        self.__downloaded += 1
+        if outcome == "resumed":
+          self.__resumed += 1
+      self.__bytes += nbytes
+      completed = self.__downloaded + self.__unchanged + self.__linked + self.__failed
+      if completed % progress_interval == 0 or completed == self.__queued:
+        print("Downloads: " + str(completed) + " of " + str(self.__queued) + " (" + str(self.__failed) + " failed)   \r", end='')
+
+  def __record(self, name, url, size, response, file_location, complete):
+    if self.__manifest != None:
+      self.__manifest.set(name, {"url": url, "size": size, "etag": response.headers.get("ETag", ""),
+                                 "last_modified": response.headers.get("Last-Modified", ""),
+                                 "path": file_location, "complete": complete})
+
+  # download one file (runs in a worker thread)
+  def __download(self, name, pagetitle):
+    url = self.__base_url + name
+    file_location = self.__download_path + name
+    part_location = file_location + ".part"
+    nbytes = 0
+    outcome = "failed"
+    reason = ""
+    with self.__host_slot(url):
+      try:
+        entry = None
+        if self.__manifest != None:
+          entry = self.__manifest.get(name)
+        local_size = file_size(file_location)
+        headers = {}
+        offset = 0
+
+        if local_size >= 0 and entry == None and self.__manifest != None:
+          # downloaded before the manifest existed - compare size with the server copy
+          with self.__session.head(url, timeout = self.__timeout) as response:
+            if response.status_code == 200 and response_size(response, 0) == local_size:
+              self.__record(name, url, local_size, response, file_location, True)
+              outcome = "unchanged"
+
+        elif local_size < 0 and self.__store != None and file_size(part_location) <= 0:
+          # not downloaded yet - the same content may already be in the media store
+          with self.__session.head(url, timeout = self.__timeout) as response:
+            if response.status_code == 200:
+              digest = self.__store.find(response.headers.get("ETag", ""), response_size(response, 0))
+              if digest != None:
+                self.__store.link(digest, file_location)
+                self.__store.add(self.__site, name, file_location, response.headers.get("ETag", ""))
+                self.__record(name, url, file_size(file_location), response, file_location, True)
+                outcome = "linked"
+
+        elif entry != None and entry["complete"] and local_size >= 0 and local_size != entry["size"]:
+          if local_size < entry["size"]:                     # truncated - fetch the rest of the file
+            if os.path.islink(file_location) or os.stat(file_location).st_nlink > 1:
+              shutil.copyfile(file_location, part_location)    # linked to a media store blob - do not write to it
+              os.remove(file_location)
+            else:
+              os.replace(file_location, part_location)
+          else:
+            os.remove(file_location)                           # damaged - fetch again
+          local_size = -1
+          entry["complete"] = False
+
+        if outcome != "unchanged" and outcome != "linked":
+          validator = ""
+          if entry != None:
+            validator = entry["etag"] or entry["last_modified"]
+          if entry != None and entry["complete"] and local_size == entry["size"]:
+            if entry["etag"] != "":                            # complete copy - ask only for changes
+              headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] != "":
+              headers["If-Modified-Since"] = entry["last_modified"]
+          elif file_size(part_location) > 0 and validator != "":
+            offset = file_size(part_location)                  # interrupted download - ask for the rest
+            headers["Range"] = "bytes=" + str(offset) + "-"
+            headers["If-Range"] = validator
+
+          # download as a stream to overcome output buffer limits at server
+          with self.__session.get(url, stream = True, timeout = self.__timeout, headers = headers) as response:
+            if response.status_code == 304:
+              outcome = "unchanged"
+            elif response.status_code == 200 or (response.status_code == 206 and offset > 0):
+              if response.status_code == 200:
+                offset = 0                                     # server sent the whole file
+              size = response_size(response, offset)
+              self.__record(name, url, size, response, file_location, False)
+              with open(part_location, 'ab' if offset > 0 else 'wb') as part_file:
+                for chunk in response.iter_content(chunk_size = chunk_size):
+                  part_file.write(chunk)
+                  nbytes += len(chunk)
+              if size >= 0 and file_size(part_location) != size:
+                reason = "incomplete: " + str(file_size(part_location)) + " of " + str(size) + " bytes"
+              else:
+                os.replace(part_location, file_location)      # complete file appears under its real name
+                self.__record(name, url, file_size(file_location), response, file_location, True)
+                if self.__store != None:
+                  self.__store.add(self.__site, name, file_location, response.headers.get("ETag", ""))
+                outcome = "resumed" if offset > 0 else "downloaded"
+            else:
+              reason = "status " + str(response.status_code)
+              if response.status_code == 416 and offset > 0:
+                os.remove(part_location)                       # .part file not usable - start again next time
+      except Exception as error:                              # connection failures, timeouts, file errors
+        reason = type(error).__name__ + ": " + str(error)     # any .part file is kept to resume next time
+
+    if outcome == "downloaded" or outcome == "resumed":
+      self.__log(url + " downloaded successfully\n" + name + " saved\n")
+    elif outcome == "unchanged":
+      self.__log(url + " unchanged\n")
+    elif outcome == "linked":
+      self.__log(url + " linked from the media store\n" + name + " saved\n")
+    else:
+      self.__log(url + " could not be accessed (" + pagetitle + ") " + reason + "\n")
+    self.__done(name, url, pagetitle, nbytes, outcome, reason)
+    return
@@ -0,0 +1,144 @@
+'''  media_inventory.py
+
+ Inventory of image and media files known to be available locally
+
+ The MediaInventory class holds every known media file name in a dictionary keyed on the
+ normalised file name, so that checking whether a file referenced on a wiki page is already
+ available takes a single lookup. File names are kept in the order they were added (for
+ writing the new media file list), and for each file the inventory records where it was
+ seen:
+   "list"   - the media file list file
+   "folder" - the local media folder
+   "new"    - referenced on a wiki page but not previously available
+
+ scan_media_folders lists the files in one or more media folders, including sub-folders, with
+ the size and modification time of each file. The listing is kept in a folder cache file, and
+ on later runs only folders whose modification time has changed (a file was added, removed or
+ renamed in that folder) are read again, so refreshing the listing of a large media folder
+ costs one os.stat per folder.
+
+ Folder cache file (JSON):
+   {"version": folder_cache_version,
+    "folders": {folder path: {"mtime": ns, "files": {name: [size, mtime ns]}, "folders": [sub-folder names]}}}
+
+'''
+import os
+from wiki_names import media_key          # media file name normal form (inventory key)
+from json_files import load_versioned_json, save_json_atomic
+
+folder_cache_version = "1"
+
+
+#=====================================================================================================
+#
+# MediaInventory class
+#
+# add(name, source)  - add a file name seen in the given source, returns True if the file was not
+#                      previously in the inventory
+# discover(name)     - add a file referenced on a wiki page with source "new", unless it is already
+#                      in the inventory - returns True if the file was not previously in the inventory
+# contains(name)     - True if the file (in any spelling that normalises the same way) is known
+# sources(name)      - list of sources in which the file has been seen
+# names()            - file names in the order they were added
+# count(source)      - number of files seen in a source (or all files if source is None)
+#
+class MediaInventory:
+  def __init__(self):
+    self.__files = {}       # media_key => (file name as first seen, list of sources)
+
+  def __len__(self):
+    return len(self.__files)
+
+  def add(self, name, source):
+    key = media_key(name)
+    entry = self.__files.get(key)
+    if entry == None:
+      self.__files[key] = (name, [source])
+      return True
+    if source not in entry[1]:
+      entry[1].append(source)
+    return False
+
+  def discover(self, name):
+    key = media_key(name)
+    if key in self.__files:
+      return False
+    self.__files[key] = (name, ["new"])
+    return True
+
+  def contains(self, name):
+    return media_key(name) in self.__files
+
+  def sources(self, name):
+    entry = self.__files.get(media_key(name))
+    if entry == None:
+      return []
+    return entry[1]
+
+  def names(self):
+    return [entry[0] for entry in self.__files.values()]
+
+  def count(self, source = None):
+    if source == None:
+      return len(self.__files)
+    n = 0
+    for entry in self.__files.values():
+      if source in entry[1]:
+        n += 1
+    return n
+
+
+#=====================================================================================================
+#
+# function to list the files in media folders and their sub-folders
+#
+# Returns a list of (path, size, mtime) for every file, where mtime is the modification time in
+# nanoseconds. If cache_file_name is given, folders unchanged since the last scan are taken from
+# the cache file, and the cache file is updated (entries for folders outside the given folders
+# are kept, so one cache file can be shared by scans of different folders). Names starting with
+# "." are ignored.
+#
+def scan_media_folders(folders, cache_file_name = None):
+  cache = {}
+  if cache_file_name != None:
+    saved = load_versioned_json(cache_file_name, folder_cache_version)
+    if saved != None:                       # otherwise scan everything
+      cache = saved.get("folders", {})
+
+  new_cache = {}
+  for folder, entry in cache.items():
+    inside = False
+    for top_folder in folders:
+      if folder == top_folder or folder.startswith(os.path.join(top_folder, "")):
+        inside = True
+    if not inside:
+      new_cache[folder] = entry
+  files = []
+  pending = list(reversed(folders))
+  while len(pending) > 0:
+    folder = pending.pop()
+    try:
+      folder_mtime = os.stat(folder).st_mtime_ns
+    except OSError:                         # folder removed or not available
+      continue
+    entry = cache.get(folder)
+    if entry == None or entry["mtime"] != folder_mtime:
+      entry = {"mtime": folder_mtime, "files": {}, "folders": []}
+      with os.scandir(folder) as folder_entries:
+        for dir_entry in folder_entries:
+          if dir_entry.name.startswith("."):
+            continue
+          if dir_entry.is_dir():
+            entry["folders"] += [dir_entry.name]
+          elif dir_entry.is_file():
+            stat = dir_entry.stat()
+            entry["files"][dir_entry.name] = [stat.st_size, stat.st_mtime_ns]
+    new_cache[folder] = entry
+    for name, (size, mtime) in entry["files"].items():
+      files += [(os.path.join(folder, name), size, mtime)]
+    for name in reversed(entry["folders"]):
+      pending += [os.path.join(folder, name)]
+
+  if cache_file_name != None:
+    save_json_atomic(cache_file_name, {"version": folder_cache_version, "folders": new_cache})
+  return files
@@ -0,0 +1,159 @@
+'''  media_store.py
+
+ Content-addressed store of media files, shared by all sites
+
+ Each different file content is kept once, as a blob named by the SHA-256 hash of its content
+ (objects/<first 2 characters>/<hash> in the store folder). A database in the store folder
+ records, for each site, the hash of the content of each file name, and for each blob its size
+ and MD5 hash. The files in the download folders stay where they are, but as hard links to the
+ blobs (symbolic links if hard links are not possible, e.g. on another drive), so a file used
+ under several names or on several sites takes the space of one copy. A linked file must not be
+ written to in place, as that would change the blob (media_download.py copies a truncated file
+ before fetching the rest of it). A blob which no longer has its recorded size is not matched by
+ find, and is replaced when the same content is added again.
+
+ The media bucket gives the MD5 hash of a file as its ETag (except for files uploaded in parts),
+ so the downloader can ask for the ETag and size of a missing file (HEAD request) and, if the
+ store already has that content under any name or site, link the file from the store instead
+ of downloading it (see media_download.py). ETags which are not MD5 hashes are matched with
+ the ETags recorded for earlier downloads.
+
+ Database (SQLite, media_store.db in the store folder):
+   blobs   hash, size, md5
+   names   site, name, hash, etag
+
+ Usage:
+   store = MediaStore(store_folder)
+   store.import_files(site, files)              # files already downloaded, (path, size, mtime)
+   digest = store.find(etag, size)              # content already in the store, or None
+   store.link(digest, file_location)
+   store.add(site, name, file_location, etag)   # file just downloaded
+   store.close()
+
+'''
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from media_audit import file_hashes
+
+store_file_name = "media_store.db"
+
+md5_pattern = re.compile(r'^[0-9a-f]{32}$')
+
+
+#=====================================================================================================
+#
+# MediaStore class - shared by the download threads and by the sites of a run
+#
+class MediaStore:
+  def __init__(self, folder):
+    self.__folder = folder                      # store folder (with a slash at the end)
+    os.makedirs(folder + "objects", exist_ok = True)
+    self.__lock = threading.Lock()
+    self.__db = sqlite3.connect(folder + store_file_name, check_same_thread = False)
+    self.__db.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER, md5 TEXT)")
+    self.__db.execute("CREATE INDEX IF NOT EXISTS blobs_md5 ON blobs (md5)")
+    self.__db.execute("CREATE TABLE IF NOT EXISTS names (site TEXT, name TEXT, hash TEXT, etag TEXT, PRIMARY KEY (site, name))")
+    self.__db.execute("CREATE INDEX IF NOT EXISTS names_etag ON names (etag)")
+    self.__db.commit()
+
+  def blob_path(self, digest):
+    return self.__folder + "objects/" + digest[:2] + "/" + digest
+
+  def lookup(self, site, name):
+    with self.__lock:
+      row = self.__db.execute("SELECT hash FROM names WHERE site = ? AND name = ?", (site, name)).fetchone()
+    if row == None:
+      return None
+    return row[0]
+
+  # hash of content already in the store with this ETag and size (-1 if not known), or None
+  def find(self, etag, size = -1):
+    etag = etag.strip('"').lower()
+    if etag.startswith("w/"):                   # weak ETag - not a hash of the content
+      return None
+    with self.__lock:
+      if md5_pattern.match(etag):
+        row = self.__db.execute("SELECT hash, size FROM blobs WHERE md5 = ?", (etag,)).fetchone()
+      else:
+        row = self.__db.execute("SELECT blobs.hash, blobs.size FROM names JOIN blobs ON names.hash = blobs.hash WHERE names.etag = ?",
+                                (etag,)).fetchone()
+    if row == None or (size >= 0 and row[1] != size) or not self.blob_intact(row[0], row[1]):
+      return None
+    return row[0]
+
+  # True if the blob is there with its recorded size (a linked file truncated in place truncates
+  # the blob too)
+  def blob_intact(self, digest, size):
+    blob = self.blob_path(digest)
+    return os.path.exists(blob) and os.path.getsize(blob) == size
+
+  # make file_location a link to the blob (hard link, symbolic link or, failing both, a copy)
+  def link(self, digest, file_location):
+    blob = self.blob_path(digest)
+    temp_location = file_location + ".link"
+    if os.path.lexists(temp_location):
+      os.remove(temp_location)
+    try:
+      os.link(blob, temp_location)
+    except OSError:
+      try:
+        os.symlink(os.path.abspath(blob), temp_location)
+      except OSError:
+        shutil.copyfile(blob, temp_location)
+    os.replace(temp_location, file_location)
+
+  # record a file for a site - the content is added to the store if it is not there already,
+  # otherwise the file is replaced by a link to the blob. Returns the hash of the content.
+  def add(self, site, name, file_location, etag = ""):
+    digest, md5 = file_hashes(file_location, ("sha256", "md5"))     # one pass for both hashes
+    size = os.path.getsize(file_location)
+    blob = self.blob_path(digest)
+    os.makedirs(os.path.dirname(blob), exist_ok = True)
+    if os.path.exists(blob) and os.path.getsize(blob) != size:
+      os.remove(blob)                           # damaged blob (e.g. a linked file truncated) - replaced by this file
+    if not os.path.exists(blob):
+      try:
+        os.link(file_location, blob)
+      except FileExistsError:                   # added by another thread at the same time
+        pass
+      except OSError:
+        shutil.copyfile(file_location, blob)
+    if not os.path.samefile(blob, file_location):
+      self.link(digest, file_location)          # the same content is already stored
+    with self.__lock:
+      self.__db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", (digest, size, md5))
+      self.__db.execute("INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)", (site, name, digest, etag.strip('"').lower()))
+      self.__db.commit()
+    return digest
+
+  # add files already in a download folder - files recorded before are not read again unless
+  # their size has changed. files is a list of (path, size, mtime). Returns the number added.
+  def import_files(self, site, files):
+    added = 0
+    for path, size, mtime in files:
+      name = os.path.basename(path)
+      digest = self.lookup(site, name)
+      if digest != None:
+        with self.__lock:
+          row = self.__db.execute("SELECT size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row != None and row[0] == size and self.blob_intact(digest, size):
+          continue
+      try:
+        self.add(site, name, path)
+        added += 1
+      except OSError:                           # file removed or not readable
+        pass
+    return added
+
+  def counts(self):
+    with self.__lock:
+      n_names = self.__db.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+      n_blobs, n_bytes = self.__db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+    return {"names": n_names, "blobs": n_blobs, "bytes": n_bytes}
+
+  def close(self):
+    with self.__lock:
+      self.__db.close()
@@ -0,0 +1,98 @@
+'''  media_usage.py
+
+ Index of the wiki pages using each image and media file
+
+ MediaUsage collects, while the pages are processed, the titles of the pages referring to each
+ file (in page order, each title once). At the end of the run the index is saved as one file,
+ and the description files ("used in <page title>" for each page, one file per image in the
+ description folder) are written in one pass by write_descriptions.
+
+ When the description files are written, the index is also saved as a second file (the
+ descriptions index), which says what each description file holds. The next run that writes the
+ description files compares with it, so only the description files whose list of pages has
+ changed (or which are missing) are written, and description files of images no longer used on
+ any page are removed. Running sitemap.py again gives the same description files - there is no
+ need to delete them first. The media usage index itself is saved by every run, so it cannot be
+ used for this (runs which do not write the description files would make it out of date).
+
+ Index file (JSON): {"version": usage_version, "media": {file name: [page title, ...]}}
+
+'''
+import os
+from wiki_names import media_key
+from json_files import load_versioned_json, save_json_atomic
+
+usage_version = "1"
+
+
+#=====================================================================================================
+#
+# MediaUsage class
+#
+class MediaUsage:
+  def __init__(self):
+    self.__media = {}          # file name => list of page titles
+    self.__seen = set()        # (file name, page title) pairs already added
+
+  def add(self, name, pagetitle):
+    if (name, pagetitle) not in self.__seen:
+      self.__seen.add((name, pagetitle))
+      self.__media.setdefault(name, []).append(pagetitle)
+
+  def pages(self, name):
+    return self.__media.get(name, [])
+
+  def media(self):
+    return self.__media
+
+  def references(self):              # media_key (see wiki_names.py) => page titles
+    references = {}
+    for name, titles in self.__media.items():
+      pages = references.setdefault(media_key(name), [])
+      for title in titles:
+        if title not in pages:
+          pages += [title]
+    return references
+
+  def __len__(self):
+    return len(self.__media)
+
+  def save(self, file_name):
+    save_json_atomic(file_name, {"version": usage_version, "media": self.__media})
+
+
+#=====================================================================================================
+#
+# function to load an index saved by an earlier run - dictionary: file name => page titles
+# (empty if there is no index file, or it cannot be read)
+#
+def load_media_usage(file_name):
+  saved = load_versioned_json(file_name, usage_version)
+  if saved == None:                         # no index file, damaged or older version - write every description file
+    return {}
+  return saved.get("media", {})
+
+
+#=====================================================================================================
+#
+# function to write the description files which have changed since the previous run
+#
+# previous is the descriptions index saved when the description files were last written (see
+# load_media_usage). Returns (files written,
+# files removed).
+#
+def write_descriptions(folder, usage, previous):
+  written = 0
+  for name, titles in usage.media().items():
+    file_name = folder + name + ".txt"
+    if previous.get(name) != titles or not os.path.exists(file_name):
+      with open(file_name, 'w', encoding="utf-8") as desc_file:
+        desc_file.write("".join(["used in " + title + "\n" for title in titles]))
+      written += 1
+
+  removed = 0
+  for name in previous:
+    if len(usage.pages(name)) == 0 and os.path.exists(folder + name + ".txt"):
+      os.remove(folder + name + ".txt")
+      removed += 1
+  return (written, removed)
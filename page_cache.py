@@ -0,0 +1,89 @@
+'''  page_cache.py
+
+ Cache of page records from earlier sitemap runs
+
+ A MediaWiki XML backup includes a <sha1> checksum of the text of each page. The page cache
+ file keeps, for every page title, the checksum and the page record produced by
+ page_scan.scan_page (categories, links, media files, lifespan etc.). When a new XML file is
+ processed, pages whose checksum is unchanged are given their cached record and are not
+ scanned again. Only pages which have been added or changed are scanned; pages which have
+ been deleted are dropped from the cache when it is saved.
+
+ The checksum only covers the page text, so a new revision with the same text (a revert, or a
+ protection change) has the same checksum. The title, namespace and timestamp are therefore
+ always read from the head of the page in the XML file (page_scan.scan_head) and put in place
+ of those in the cached record - only what comes from the page text is taken from the cache.
+
+ Only pages with a <text> element are kept in the cache. The sitemap entries and bad links
+ are not cached - they are produced again from the page records on every run, because they
+ also depend on the categories list and on which other pages exist, and this is quick
+ compared with scanning the page text.
+
+ The cache is a JSON file:
+   {"version": cache_version, "pages": {title: [checksum, record], ...}}
+
+'''
+import hashlib
+from page_scan import scan_head
+from json_files import load_versioned_json, save_json_atomic
+
+cache_version = "2"        # change this whenever page_scan.scan_page changes the records it returns
+
+
+#=====================================================================================================
+#
+# function to return the page head fields (title, namespace and timestamp - see
+# page_scan.scan_head) and checksum of a page
+#
+# The <sha1> of the latest revision is used if present (it is near the end of the page text),
+# otherwise a checksum of the page text is calculated.
+#
+def page_key(page_text, counts = None):
+  head, text_open = scan_head(page_text, counts)
+  st_pt = page_text.rfind("<sha1>")
+  en_pt = page_text.rfind("</sha1>")
+  if st_pt >= 0 and en_pt > st_pt + 6:
+    return (head, page_text[st_pt + 6:en_pt])
+  return (head, hashlib.sha1(page_text.encode('utf-8')).hexdigest())
+
+
+#=====================================================================================================
+#
+# functions to load and save the page cache (dictionary: title => [checksum, record])
+#
+def load_page_cache(file_name):
+  cache = load_versioned_json(file_name, cache_version)
+  if cache == None:                         # no cache file, damaged or older version - start again
+    return {}
+  return cache.get("pages", {})
+
+def save_page_cache(file_name, pages):
+  save_json_atomic(file_name, {"version": cache_version, "pages": pages})
+
+
+#=====================================================================================================
+#
+# generator to attach cached records to pages
+#
+# Yields (page_text, checksum, record) for each page. If the page is unchanged since the cache
+# was saved, record is the cached page record, with the title, namespace and timestamp of this
+# revision, and page_text is None (so that the text is not passed to a worker process);
+# otherwise record is None and the page has to be scanned.
+# counts is a dictionary updated with the numbers of "cached" and "scanned" pages, and the
+# "regex_passes" made reading the page heads (see page_scan.scan_head).
+#
+def cached_pages(pages, cache, counts):
+  counts["cached"] = 0
+  counts["scanned"] = 0
+  counts["regex_passes"] = 0
+  for page_text in pages:
+    head, checksum = page_key(page_text, counts)
+    entry = cache.get(head["title"])
+    if entry != None and entry[0] == checksum:
+      counts["cached"] += 1
+      record = dict(entry[1])
+      record.update(head)
+      yield (None, checksum, record)
+    else:
+      counts["scanned"] += 1
+      yield (page_text, checksum, None)
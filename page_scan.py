@@ -0,0 +1,158 @@
+'''  page_scan.py
+
+ Single pass scanner for pages read from an XML backup of the wiki site
+
+ scan_page takes the text of one page (between <page> and </page>, as returned by
+ wiki_dump.iter_pages) and returns a page record - a dictionary with:
+   title       page title
+   namespace   namespace number (text)
+   timestamp   timestamp of the latest revision ("none" if not found)
+   has_text    True if the page has a <text> element
+   redirect    True if the page is a redirect
+   categories  categories, in order of appearance (text following "Category:", up to "]]")
+   links       internal page links (link target with "_" replaced by spaces, no "|" text)
+   files       image file names following "File:", without duplicates
+   media       media file names following "Media:", without duplicates
+   lifespan    birth and death years, e.g. "1850-1920" or "1850- ----" (see below)
+
+ The wiki text is scanned once with a single regular expression. Text inside <pre> and
+ <nowiki> sections is skipped as the scan passes over it, rather than being removed from a
+ copy of the text first. Links are taken from each [[ ... ]] pair, so two links on the same
+ line are read as two links. File references in <gallery> sections ("File:name|caption",
+ without brackets) are also found.
+
+ The lifespan is the first four-digit year following an opening bracket, then the next
+ four-digit year (or "----") followed by a closing bracket, e.g. "(1850 - 1920)".
+
+ scan_head and scan_page can count the searches they make with regular expressions (for the run
+ report): if a counts dictionary is given, its "regex_passes" item is increased by the number
+ of pattern searches (head patterns, redirect, the scan of the wiki text and the death year).
+
+'''
+import re
+
+# wiki text tokens - <pre> and <nowiki> sections (to be skipped), [[ ... ]] links, bare file
+# references in galleries, and "(" followed by a year (start of a lifespan). The opening tag of a
+# section may have attributes (with values escaped as &quot;...&quot;), but a self-closing tag
+# (<nowiki />, often used to end a link) does not open a section.
+scan_pattern = re.compile(r'(?P<skip>&lt;(?P<tag>pre|nowiki)(?:\s(?:(?!&gt;).)*?)?(?<!/)&gt;.*?&lt;/(?P=tag)&gt;)'
+                          r'|\[\[(?P<link>[^\[\]\n]+)\]\]'
+                          r'|(?<![A-Za-z])(?P<bare>(?:File|Media)\s?:[^|\n\[\]]+)(?=\|)'
+                          r'|\((?P<year>\d{4})',
+                          re.IGNORECASE | re.DOTALL)
+death_pattern = re.compile(r'[\s-]{1,5}([-\d]{4})[\)]')
+redirect_pattern = re.compile(r'\s*#REDIRECT', re.IGNORECASE)
+text_open_pattern = re.compile(r'<text.*?>', re.DOTALL)
+title_pattern = re.compile(r'<title>(.+?)</title>')
+namespace_pattern = re.compile(r'<ns>(.+?)</ns>')
+timestamp_pattern = re.compile(r'<timestamp>(.+?)</timestamp>')
+
+# link prefixes which are not links to pages
+link_kinds = {"category": "categories", "file": "files", "media": "media", "special": "skip"}
+
+
+#=====================================================================================================
+#
+# function to return the first group of a pattern found in text, or a default
+#
+def find_field(pattern, text, default):
+  field_match = pattern.search(text)
+  if field_match:
+    return field_match.group(1)
+  return default
+
+
+#=====================================================================================================
+#
+# function to read the title, namespace and timestamp from the head of a page (the part before
+# the <text> element) - returns (dictionary of the three fields, <text> opening tag match or None)
+#
+# These fields describe the revision rather than the wiki text, so they are read again even for
+# pages taken from the page cache (see page_cache.py).
+#
+def scan_head(page_text, counts = None):
+  if counts != None:
+    counts["regex_passes"] += 4           # <text> tag, title, namespace and timestamp
+  text_open = text_open_pattern.search(page_text)
+  if text_open:
+    page_head = page_text[:text_open.start()]
+  else:
+    page_head = page_text
+  head = {"title": find_field(title_pattern, page_head, ""),
+          "namespace": find_field(namespace_pattern, page_head, ""),
+          "timestamp": find_field(timestamp_pattern, page_head, "none")}
+  return (head, text_open)
+
+
+#=====================================================================================================
+#
+# function to scan a page and return the page record
+#
+def scan_page(page_text, counts = None):
+  record = {"title": "", "namespace": "", "timestamp": "none", "has_text": False, "redirect": False,
+            "categories": [], "links": [], "files": [], "media": [], "lifespan": ""}
+
+  head, text_open = scan_head(page_text, counts)
+  record.update(head)
+  if not text_open:
+    return record
+
+  record["has_text"] = True
+  wikitext_pt = text_open.end()
+  record["redirect"] = redirect_pattern.match(page_text, wikitext_pt) != None
+  passes = 2                              # redirect and the scan of the wiki text
+
+  files = {}        # dictionaries used as ordered sets
+  media = {}
+  for token in scan_pattern.finditer(page_text, wikitext_pt):
+    if token.group('skip'):
+      continue
+
+    if token.group('year'):
+      if record["lifespan"] == "":
+        death = death_pattern.search(page_text, token.end())
+        passes += 1
+        if death:
+          record["lifespan"] = token.group('year') + "-" + death.group(1)
+        else:
+          record["lifespan"] = token.group('year') + "- ----"
+      continue
+
+    if token.group('bare'):
+      reference = token.group('bare')
+      kind = "files" if reference[0] in "Ff" else "media"
+    else:
+      reference = token.group('link')
+      kind = ""
+      colon_p = reference.find(":")
+      if colon_p > 0:
+        kind = link_kinds.get(reference[:colon_p].strip(" ").lower(), "")
+
+    if kind == "skip":
+      continue
+
+    if kind == "categories":
+      record["categories"] += [reference[reference.find(":") + 1:]]
+    elif kind == "files" or kind == "media":
+      name = reference[reference.find(":") + 1:]
+      bar_p = name.find("|")
+      if bar_p >= 0:
+        name = name[:bar_p]
+      name = name.lstrip(" ")
+      if name != "":
+        if kind == "files":
+          files[name] = True
+        else:
+          media[name] = True
+    else:
+      target = reference
+      bar_p = target.find("|")
+      if bar_p >= 0:
+        target = target[:bar_p]
+      record["links"] += [target.rstrip(" ").replace("_", " ")]
+
+  record["files"] = list(files)
+  record["media"] = list(media)
+  if counts != None:
+    counts["regex_passes"] += passes
+  return record
@@ -0,0 +1,85 @@
+'''  run_report.py
+
+ Timings and counters for a sitemap run, saved as a JSON report
+
+ The RunReport class collects, while sitemap.py runs:
+   phases      wall clock time of each phase of the run, in the order the phases ran (a
+               phase lasts until the next phase starts, or until the report is saved)
+   namespaces  for each namespace, the number of pages and the average time taken to process
+               a page (seconds)
+   slowest     the pages which took longest to process, with their size (characters of XML,
+               0 for a page taken from the page cache)
+   counters    named counts, e.g. pages scanned, regular expression passes, links looked up,
+               media files downloaded and bytes downloaded
+ and save() writes them to a JSON file, so that one run can be compared with the next.
+
+ Usage:
+   report = RunReport()
+   report.phase("pages")
+   ...
+   report.page(title, namespace, size, seconds)    # for each page
+   report.count("links_checked", n)
+   report.phase("render")
+   ...
+   report.save(file_name)
+
+'''
+import time
+import json
+import heapq
+
+slowest_pages = 20        # number of slowest pages listed in the report
+
+
+#=====================================================================================================
+#
+# RunReport class
+#
+class RunReport:
+  def __init__(self):
+    self.__start_time = time.time()
+    self.__phases = {}          # phase name => seconds
+    self.__phase = None         # current phase name
+    self.__phase_start = 0.0
+    self.__namespaces = {}      # namespace => [pages, seconds]
+    self.__slowest = []         # heap of (seconds, title, namespace, size) - the slowest pages
+    self.__counters = {}
+
+  def phase(self, name):
+    now = time.perf_counter()
+    if self.__phase != None:
+      self.__phases[self.__phase] = self.__phases.get(self.__phase, 0.0) + now - self.__phase_start
+    self.__phase = name
+    self.__phase_start = now
+
+  def page(self, title, namespace, size, seconds):
+    totals = self.__namespaces.setdefault(namespace, [0, 0.0])
+    totals[0] += 1
+    totals[1] += seconds
+    item = (seconds, title, namespace, size)
+    if len(self.__slowest) < slowest_pages:
+      heapq.heappush(self.__slowest, item)
+    elif item > self.__slowest[0]:
+      heapq.heapreplace(self.__slowest, item)
+
+  def count(self, name, n = 1):
+    self.__counters[name] = self.__counters.get(name, 0) + n
+
+  def report(self):
+    namespaces = {}
+    for namespace, (pages, seconds) in sorted(self.__namespaces.items()):
+      namespaces[namespace] = {"pages": pages, "average_seconds": round(seconds / pages, 6)}
+    slowest = []
+    for seconds, title, namespace, size in sorted(self.__slowest, reverse = True):
+      slowest += [{"title": title, "namespace": namespace, "size": size, "seconds": round(seconds, 6)}]
+    phases = {}
+    for name, seconds in self.__phases.items():
+      phases[name] = round(seconds, 4)
+    return {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.__start_time)),
+            "total_seconds": round(time.time() - self.__start_time, 4), "phases": phases,
+            "namespaces": namespaces, "slowest_pages": slowest, "counters": dict(self.__counters)}
+
+  def save(self, file_name):
+    self.phase(None)
+    with open(file_name, 'w', encoding="utf-8") as report_file:
+      json.dump(self.report(), report_file, indent = 2, ensure_ascii = False)
@@ -0,0 +1,156 @@
+'''  search_index.py
+
+ Search index of the site pages, built by sitemap.py from the sitemap entries
+
+ The index is a single JSON file which a static web page or a small script can load and query
+ without the wiki: every page in the sitemap with its display name, namespace, categories,
+ lifespan and timestamp, and postings lists to find pages by the words of their names, by the
+ start of a word, or by category.
+
+ Index file (JSON):
+   {"version": index_version, "source": XML file name,
+    "fields": ["title", "name", "namespace", "categories", "lifespan", "timestamp"],
+    "pages": [[title, display name, namespace, [categories], lifespan, timestamp], ...],
+    "tokens": [word, ...],                   sorted
+    "postings": [[page number, ...], ...],   pages containing each word of tokens, in page order
+    "prefixes": {first letters: [first, last + 1]},   range of tokens starting with those letters
+    "categories": {category: [page number, ...]}}
+
+ Words are the runs of letters and digits in the display name and title (without the namespace)
+ of a page, in lower case. To find the pages for the start of a word, take the prefixes range
+ for its first prefix_length letters (or the whole word if shorter) and check the tokens in that
+ range.
+ search() does this for a query of one or more words - every word must match (the last word
+ may be the start of a word, as typed in a search box).
+
+ Usage (command line):
+   python search_index.py <index file> <words...>
+
+'''
+import re
+import sys
+from bisect import bisect_left
+from wiki_names import straight_apostrophes
+from json_files import load_versioned_json, save_json_atomic
+
+index_version = "1"
+prefix_length = 2         # letters in the prefixes table keys
+
+word_pattern = re.compile(r'\w+')
+
+
+#=====================================================================================================
+#
+# function to return the words of a name or query, in lower case
+#
+def words(text):
+  return word_pattern.findall(straight_apostrophes(text).replace("'", "").casefold())
+
+
+#=====================================================================================================
+#
+# function to build the search index
+#
+# pages is a list of (entry, display name) - entry is a sitemap_pages.PageEntry
+#
+def build_search_index(pages, source = ""):
+  rows = []
+  word_pages = {}
+  category_pages = {}
+  for number, (entry, name) in enumerate(pages):
+    rows += [[entry.title, name, entry.namespace, list(entry.categories), entry.lifespan, entry.timestamp]]
+    title = entry.title if entry.namespace == "0" else entry.title[entry.title.find(":") + 1:]   # without the namespace
+    for word in set(words(name) + words(title)):
+      word_pages.setdefault(word, []).append(number)
+    for category in entry.categories:
+      category_pages.setdefault(category, []).append(number)
+
+  tokens = sorted(word_pages)
+  prefixes = {}
+  for i, token in enumerate(tokens):
+    prefix = token[:prefix_length]
+    if prefix not in prefixes:
+      prefixes[prefix] = [i, i + 1]
+    else:
+      prefixes[prefix][1] = i + 1
+  return {"version": index_version, "source": source,
+          "fields": ["title", "name", "namespace", "categories", "lifespan", "timestamp"],
+          "pages": rows, "tokens": tokens, "postings": [word_pages[token] for token in tokens],
+          "prefixes": prefixes, "categories": category_pages}
+
+
+#=====================================================================================================
+#
+# function to save the search index - written to a temporary file first, so that a page using the
+# index never sees a partly written file
+#
+def save_search_index(file_name, index):
+  save_json_atomic(file_name, index)
+
+
+#=====================================================================================================
+#
+# function to load a search index saved by save_search_index
+#
+def load_search_index(file_name):
+  index = load_versioned_json(file_name, index_version)
+  if index == None:
+    raise ValueError(file_name + " is missing, damaged or not a version " + index_version + " search index")
+  return index
+
+
+#=====================================================================================================
+#
+# function to return the page numbers for a word (whole word) or the start of a word
+#
+def word_postings(index, word, partial = False):
+  tokens = index["tokens"]
+  if not partial:
+    i = bisect_left(tokens, word)
+    if i < len(tokens) and tokens[i] == word:
+      return set(index["postings"][i])
+    return set()
+
+  found = set()
+  if len(word) < prefix_length:
+    keys = [key for key in index["prefixes"] if key.startswith(word)]
+  else:
+    keys = [word[:prefix_length]] if word[:prefix_length] in index["prefixes"] else []
+  for key in keys:
+    first, last = index["prefixes"][key]
+    for i in range(first, last):
+      if tokens[i].startswith(word):
+        found.update(index["postings"][i])
+  return found
+
+
+#=====================================================================================================
+#
+# function to find the pages matching a query - returns the page rows, in sitemap order
+#
+# Every word of the query must be in the name or title of the page. If partial is True the last
+# word may be the start of a word. Pages can be limited to a category.
+#
+def search(index, query, partial = True, category = None):
+  query_words = words(query)
+  if len(query_words) == 0 and category == None:
+    return []
+  found = None
+  if category != None:
+    found = set(index["categories"].get(category, []))
+  for n, word in enumerate(query_words):
+    pages = word_postings(index, word, partial and n == len(query_words) - 1)
+    found = pages if found == None else found & pages
+  return [index["pages"][number] for number in sorted(found)]
+
+
+#=====================================================================================================
+#
+# command line search
+#
+if __name__ == "__main__":
+  if len(sys.argv) < 3:
+    print("usage: python search_index.py <index file> <words...>")
+    sys.exit(1)
+  for title, name, namespace, categories, lifespan, timestamp in search(load_search_index(sys.argv[1]), " ".join(sys.argv[2:])):
+    print(name + " | " + title + " | " + "; ".join(categories) + " | " + lifespan + " | " + timestamp)
@@ -8,8 +8,8 @@
  Scans an exported XML file of the entire site
  1) Generates a site map listing in wiki text form to be displayed on a sitemap page the wiki site.
  2) Optionally, checks for each page that image and media files have been downloaded, and if not, retrieves them from the wiki site.
- 3) Optionally generates image description files indicating where each image has been referenced on the site. Note that if 
-    running this process more than once, the description files should all be deleted first.
+ 3) Optionally generates image description files indicating where each image has been referenced on the site. The files
+    are written at the end of the run from the media usage index (media_usage.py), and only when they have changed.
  4) Generates a reference list of pages on the site.
  
 
@@ -24,26 +24,76 @@
 240828: Lifespan detection and output provided for organisations
 240830: Repaired alphabetic tabs for biographies
 240930: Repaired sorting for profile pages
+261018: XML file read one page at a time (wiki_dump.py) instead of loading and re-slicing the whole file
+261018: Page names taken from a page index file kept beside the XML file
+261018: Internal links checked against a lookup table of normalised page titles (wiki_names.py)
+261018: Media files checked against an inventory of the media file list and media folder (media_inventory.py)
+261018: Missing media files downloaded by a pool of threads sharing the requests session (media_download.py)
+261018: Downloads recorded in a manifest so that repeated runs only fetch new, changed or incomplete files
+261018: Each page scanned once for categories, links, media files and lifespan (page_scan.py)
+261018: Pages processed in a pool of worker processes (sitemap_pages.py), results merged in page order
+261018: Page records cached between runs (page_cache.py) - only new or changed pages are scanned
+261018: Page categories sorted using a category rank lookup table (wiki_names.py) built once per run
+261018: Sitemap sections rendered from pages put in buckets by state and letter in one pass (sitemap_render.py)
+261018: Sitemap entries kept as PageEntry objects (sitemap_pages.py) rather than "|" separated text
+261018: Compressed XML files (.gz, .bz2, .xz) read directly, decompressed as they are read
+261018: Phase timings and counters saved as a JSON report (run_report.py) beside the output files
+261018: Media folders (and sub-folders) listed with os.scandir, re-reading only folders changed since the last run
+261018: Optional media audit (media_audit.py) reporting files with the same content under different names
+261018: Optional sitemap index page and subpages for each state/letter, only changed subpages written (sitemap_subpages.py)
+261018: Name functions (reformat, replace_underscore, %xx decoding) shared with crosslink.py in wiki_names.py, with cached results
+261018: JSON search index of the sitemap pages (search_index.py), written with the sitemap
+261018: Optional publishing of the sitemap with pywikibot, saving only pages which changed (sitemap_publish.py)
+261018: Internal link graph saved as compact arrays, with a report of the most linked, orphan and dead-end pages (link_graph.py)
+261018: Media usage index (media_usage.py) - description files written once at the end of the run, only if changed
+261018: Several sites can be processed in one run (sites list), at the same time, each with its own output folder
+261018: Optional media store shared by all sites (media_store.py) - content already stored is linked, not downloaded again
 
 '''
 import os
-import re 
 import requests
-from urllib.parse import unquote
-
-session = requests.Session()                                   # needed for accessing URLs to download images
-outfile = open("sitemap_log.txt","w",encoding="utf-8")             # log file reporting all operations completed
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from wiki_dump import iter_pages, load_page_index
+from wiki_names import title_lookup, CategoryRank, replace_underscore, percent_decode
+from media_inventory import MediaInventory, scan_media_folders
+from media_audit import hash_files, duplicate_groups, write_audit
+from media_download import MediaDownloader, manifest_file_name
+from sitemap_pages import init_pages, process_page
+from sitemap_render import render_sitemap, render_subpages, display_name
+from sitemap_subpages import save_subpages
+from search_index import build_search_index, save_search_index
+from sitemap_publish import publish_pages
+from link_graph import LinkGraph, write_link_report
+from media_usage import MediaUsage, load_media_usage, write_descriptions
+from media_store import MediaStore
+from page_cache import load_page_cache, save_page_cache, cached_pages
+from run_report import RunReport
 
 # Specify the folder paths - note that internally Python uses forward slashes, not backslashes as in Windows/MSDOS
 folder_path = "C:/D/2024/240315_EHWA/eha"                      # folder containing image files (no slash at end)
 download_path = "C:/D/2024/240315_EHWA/eha-downloads/"         # folder for image downloads
 description_folder = "C:/D/2024/240315_EHWA/desc/"             # image descriptions folder (with a slash)
 wkg_folder = "C:/Users/HP/OneDrive - Close Comfort Pty Ltd/Documents/Python/" # working directory (with slash)
-xml_data_file   =  "eha.xml"                                    # xml data file to be processed
+xml_data_file   =  "eha.xml"                                    # xml data file to be processed (may be compressed: .xml.gz, .xml.bz2 or .xml.xz)
 wiki_table_file =  "wiki-table-eha.txt"                         # table of page URLs generated by sitemap.py
 pages_file_name = "eha_pages.txt"                               # page list file generated by sitemap.py
 csv_file_name   = "eha_sitemap.xls"                             # spreadsheet for note-keeping
-media_file_list_name = "combined_file_list_240516.txt"          # list of files available locally in media folder(s)
+page_cache_file_name = "eha_page_cache.json"                    # page records from the previous run, kept in the working directory
+report_file_name = "eha_sitemap_report.json"                    # timings and counters for the run
+media_file_list_name = "combined_file_list_240516.txt"          # list of files available locally in other media folder(s) ("" if none)
+media_folders = [folder_path]                                   # folders (and their sub-folders) searched for media files - download_path may be added
+media_folder_cache_name = "eha_media_folders.json"              # listing of the media folders from the last run, kept in the working directory
+media_hash_cache_name = "eha_media_hashes.json"                 # content hashes of media files (media audit), kept in the working directory
+media_audit_file_name = "media_audit.txt"                       # duplicate media files report
+subpages_folder_name = "sitemap_subpages/"                      # sitemap index page and subpages (split_sitemap), in the working directory
+sitemap_page_name = "Sitemap"                                   # wiki page name of the sitemap index page (subpages are "Sitemap/...")
+search_index_file_name = "eha_search_index.json"                # search index of the sitemap pages, in the working directory
+link_graph_file_name = "eha_link_graph.bin"                     # internal link graph (link_graph.py), in the working directory
+link_report_file_name = "eha_link_report.txt"                   # most linked, orphan and dead-end pages
+media_usage_file_name = "eha_media_usage.json"                  # pages using each image and media file, in the working directory
+descriptions_file_name = "eha_descriptions.json"                # pages listed in the description files written, in the working directory
+media_store_folder = ""                                         # media store shared by all sites (with a slash at the end, "" for none)
 
 # Specify URLs
 site_URL = "https://eha.mywikis.wiki/wiki/"                     # base URL for site
@@ -54,17 +104,37 @@ wiki_url = "https://mywikis-wiki-media.s3.us-central-1.wasabisys.com/eha/"
 
 categories_file_name = "category_list.txt"                      # categories list
 
-download = False    # set to True for media file downloads and access verification are needed
+download = False    # set to True for media file downloads and access verification are needed (repeated runs only fetch changed files)
 desc_write = False   # set to True to write description file
-
-# Get a list of all image and media files already in the local media file folder, including PDFs
-media_file_list = os.listdir(folder_path)
-
-# Print the number of files in the folder
-nfiles = len(media_file_list)
-outfile.write("Media folder contains ")
-outfile.write(str(nfiles))
-outfile.write(" files\n\n")
+download_workers = 8      # number of media files downloaded at the same time
+download_host_limit = 4   # maximum number of downloads at the same time from any one host
+page_workers = os.cpu_count()   # number of worker processes for page processing (1 to process pages one at a time)
+page_chunk_size = 16            # number of pages sent to a worker process at a time
+use_page_cache = True           # set to False to scan every page again (the cache is still saved for the next run)
+media_audit = False             # set to True to report media files with the same content in folder_path and download_path
+hash_workers = 8                # number of media files hashed at the same time (media audit)
+split_sitemap = False           # set to True to also write the sitemap as an index page and a subpage for each state/letter
+search_index = True             # set to True to write the search index file (search_index.py)
+publish = False                 # set to True to save the sitemap pages which have changed on the wiki (pywikibot, as crosslink.py)
+publish_site = 'en'             # pywikibot site code for publishing (see user-config.py)
+
+# Several sites can be processed in one run - list a dictionary for each site with the settings
+# which differ from those above (any of site_setting_names, and a name for messages), e.g.
+#   sites = [{"name": "eha"},
+#            {"name": "ehwa", "xml_data_file": "ehwa.xml", "site_URL": "https://ehwa.mywikis.wiki/wiki/",
+#             "wiki_url": ".../ehwa/", "folder_path": "C:/D/2024/240315_EHWA/ehwa", "wkg_folder": ".../ehwa/", ...}]
+# Each site needs its own working directory (wkg_folder) - the log file, new media file list and
+# bad links list are written there too. The categories list is read once and used for every site.
+# An empty list processes the one site set up above, with the log files in the current folder.
+sites = []
+site_workers = 2                # number of sites processed at the same time (page_workers are shared between them)
+
+site_setting_names = ["xml_data_file", "site_URL", "wiki_url", "folder_path", "download_path", "description_folder",
+                      "wkg_folder", "wiki_table_file", "pages_file_name", "csv_file_name", "page_cache_file_name",
+                      "report_file_name", "media_file_list_name", "media_folders", "media_folder_cache_name",
+                      "media_hash_cache_name", "media_audit_file_name", "subpages_folder_name", "sitemap_page_name",
+                      "search_index_file_name", "link_graph_file_name", "link_report_file_name",
+                      "media_usage_file_name", "descriptions_file_name", "publish_site"]
 
 #=====================================================================================================
 #
@@ -78,1109 +148,396 @@ def read_list_file(file_name):
 
 #=====================================================================================================
 #
-# function to extract page names
-# 
-def extract_page_names(text): 
-    return re.findall(r'<title>(.*?)</title>', text) 
-
-#=====================================================================================================
-#
-# functions to extract media files and image files
-# 
-#  
-def extract_image_files(text): 
-    image_file_pattern = r'(?<=File:)(.+?)(?=\|)' 
-    list = re.findall(image_file_pattern, text) 
-    short_list = []
-    for file in list:
-      if file not in short_list:
-        short_list += [file]
-    return short_list    
-    
-# Function to extract media files
-def extract_media_files(text):
-    media_file_pattern = r'(?<=Media:)(.+?)(?=\|)'
-    list = re.findall(media_file_pattern, text) 
-    short_list = []
-    for file in list:
-      if file not in short_list:
-        short_list += [file]
-    return short_list    
-
-
-#=====================================================================================================
-#
-# function to extract birth year and death year from a person's biographical entry
-# 
-# 
-def lifespan(text):
-  instance = re.search(r'[\(](\d{4})', text)
-  if instance:
-    instance2 = re.search(r'[\s-]{1,5}([-\d]{4})[\)]', text[instance.end():])
-    if instance2:
-      output_text = instance.group(1) + "-" + instance2.group(1)
-    else:
-      output_text = instance.group(1) + "- ----"
-  else:
-    output_text = ""
-  return  output_text
-
-
-#=====================================================================================================
-#
-# function to replace white space and %20 characters in a filename string with underscore characters
-# 
-# 
-def replace_underscore(text):
-    text = re.sub(r'&amp;','&', text)
-    text = re.sub(r'\s+$', '', text)
-    text = re.sub(r'\s', '_', text)
-    text = re.sub(r'__','_',text)
-    text = text.lstrip('_')
-    text = re.sub(r'%20', '_', text)
-    text = re.sub(r'%27', '\'', text)   # some files have %27 instead of a single quote character (apostrophe)
-    return(text)
-
-#=====================================================================================================
-#
-# function to convert timestamp format from numeric form to mm-yy
-# 
-# 
-def timestamp_mon_year(text):
-    m = text[5:7]
-    if m == "01":
-      mm = "Jan "
-    elif m == "02":
-      mm = "Feb "
-    elif m == "03":
-      mm = "Mar "
-    elif m == "04":
-      mm = "Apr "
-    elif m == "05":
-      mm = "May "
-    elif m == "06":
-      mm = "Jun "
-    elif m == "07":
-      mm = "Jul "
-    elif m == "08":
-      mm = "Aug "
-    elif m == "09":
-      mm = "Sep "
-    elif m == "10":
-      mm = "Oct "
-    elif m == "11":
-      mm = "Nov "
-    elif m == "12":
-      mm = "Dec "
-    else:
-      mm = "*** "
-    return (mm + text[:4])
-    
-   
-#=====================================================================================================
-#
-# function to to reformat page name as Person:<surname>, <forenames>
-# 
-# this function was originally introduced to standardize the name format of the WA site pages
-# that were arranged initially as <forename> <familyname> format.
+# function to extract page names from the XML file, using the page index (built on the first
+# run, or when the XML file has changed)
 # 
-def reformat(page_name):
-    profile = False
-    name_loc = re.search("Person:",page_name) # check for "Person:" or "Profile:"
-    if not name_loc:
-      name_loc = re.search("Profile:",page_name)
-      profile = name_loc
-    if name_loc:                            # this is a "Person:" page name - don't do anything otherwise
-        page_name = page_name[name_loc.end():]  # strip "Person:"
-        # Find the text in brackets provided by perplaxity.ai
-        bracket_text = re.findall(r'\((.*?)\)', page_name)
-        # Remove the text in brackets from the original string
-        page_name = re.sub(r'\((.*?)\)', '', page_name)
-        
-        page_name = re.sub("_"," ",page_name)   # substitute _ with whitespace
-        page_name = page_name.rstrip("\n")  # remove \n character if present
-        page_name = page_name.lstrip(" ")   # remove whitespace from front
-        page_name = page_name.rstrip(" ")   # and from end too
-        if not re.search(",", page_name):       # no comma found in name - need to reformat
-            forenames = ""                      # initialize
-            family_name = page_name             # in case of single name only
-            while space_loc := re.search(r'\s', page_name):                 # search for next whitespace char
-                forenames = forenames + ' ' + page_name[:space_loc.start()] # add this name to fornames
-                page_name = page_name[space_loc.end():]                     # trim text
-                family_name = page_name                                     # rest will be family name unless another space found
-            if profile:
-              page_name = "Profile:" + family_name + ',' + forenames       # reformat the page title
-            else:
-              page_name = "Person:" + family_name + ',' + forenames       # reformat the page title
-            
-            if bracket_text:
-                page_name = page_name + ' (' + ', '.join(bracket_text) + ')'  # replace bracket string at end
-           
-        else:                                                           # comma found - name format already in correct format               
-          if profile:
-            page_name = "Profile:" + page_name
-          else:
-            page_name = "Person:" + page_name
-            
-    return(page_name)
-    
-    
-#=====================================================================================================
-#
-# function to to check for bad internal links by referring to the reference pages list
-# 
-def check_links(pagetext, pagetitle, download, pages_list):
-   bad_links = []
-   if pagetitle == "Sitemap":
-     return bad_links
-   content = pagetext
-   links = re.findall(r'\[\[(.+)\]\]',content)
-   for link in links:
-     if link[0:6] == "Media:":
-       i=1
-     elif link[0:8] == "Special:":
-       i=1
-     elif link[0:5] == "File:":
-       i=1
-     elif link[0:9] == "Category:":
-       i=1
-     else:
-       # internal page link
-       bar_loc = re.search(r'\|',link)
-       plink = link
-       if bar_loc:
-         plink = link[:bar_loc.start()]
-       plink = plink.rstrip(" ")
-       plink = plink.rstrip(" ")
-       plink = plink.rstrip(" ")
-       plink = re.sub("_"," ",plink)
-       if plink not in pages_list:
-         bad_links += [plink + "|" + pagetitle]
-         outfile.write("bad link " + plink + " in " + pagetitle + "\n")
-         
-   if bad_links == []:
-     outfile.write(pagetitle + " has no bad links\n")
-     
-   return bad_links
-     
-#=====================================================================================
-#
-# Function to parse text with separator character - ignoring trailing and leading spaces
-# Note that special characters such as a vertical bar must be specified with the 
-# backslash, for example r'\|'
-#
-# This function was introduced after much of the code was written in a rather
-# clumsy style. Several sections of code could be rearranged to use this function
-# and appear much cleaner.
-#
-def separate_text(sep, text):
-
-  items = []
-  found = True
-  m_pt = 0
-  en_pt = 0
-  n_items = 0
-  while found:
-    #print(text[m_pt:])
-    sep_p = re.search(sep,text[m_pt:])
-    if sep_p == None:
-      found = False
-      item = text[m_pt:]
-    else:
-      n_items += 1
-      st_pt = sep_p.start()
-      en_pt = sep_p.end()
-      item = text[m_pt:st_pt + m_pt]
-    
-      
-    #print(str(m_pt), str(st_pt), str(en_pt), item)
-    if len(item) > 0:
-      while item[0] == " ":
-        item = item.lstrip(" ")
-        if len(item) == 0:
-          break
-    if len(item) > 0:
-      while item[len(item)-1] == " " and len(item) > 0:
-        item = item.rstrip(" ")
-        if len(item) == 0:
-          break
-    items += [item]    
-    m_pt = en_pt + m_pt
-    if n_items > 10:
-      found = False
-
-  return items
+def extract_page_names(file_name): 
+    names = []
+    for entry in load_page_index(file_name):
+      names += [entry[0]]
+    return names
 
 #====================================================================================================
 #
 # function to identify image and media file references and download files to local media folder 
 #
-def download_media(pagetext, pagetitle, download, media_file_list):
+# missing files are queued on media_downloader, and messages written to the log file outfile
+#
+def download_media(record, pagetitle, download, media_inventory, media_usage, media_downloader, outfile):
     
-  pagetext = re.sub(r'\&lt\;PRE\&gt\;(.+?)\&lt\;\/PRE\&gt\;', "", pagetext, flags=re.IGNORECASE | re.MULTILINE | re.DOTALL)  # remove <pre> .... </pre> text segments  
-  pagetext = re.sub(r'\&lt\;NOWIKI\&gt\;(.+?)\&lt\;\/NOWIKI\&gt\;', "", pagetext, flags=re.IGNORECASE | re.MULTILINE | re.DOTALL)  # remove <nowiki> .... </nowiki> text segments
-  # extract alphabetically sorted list of image file references in the XML text
-  images = extract_image_files(pagetext)
-  sort_images = sorted(images)
+  # alphabetically sorted list of image file references from the page record (see page_scan.py)
+  sort_images = sorted(record["files"])
   missing_media_files = []
-  #print(pagetext)
   
   # check to see if any of the referenced image files is not in the images folder
   for name in sort_images:
-     name = unquote(name)
-     name = replace_underscore(name)
-
-     description = "used in " + pagetitle + "\n"
-     if desc_write: 
-       descfile = open(description_folder + name + ".txt", "a")            # append record to description file
-       descfile.write(description)
-       descfile.close()
+     name = replace_underscore(percent_decode(name))
+     media_usage.add(name, pagetitle)          # for the description file (see media_usage.py)
 
-     if name not in media_file_list:  # has not been downloaded yet
+     if media_inventory.discover(name):  # has not been downloaded yet
          missing_media_files += [name]
-         media_file_list += [name]
-         # create / append description file    
          
          if download:
-           if name not in media_file_list:
-              outfile.write(name)
-              outfile.write(" is not in the media files folder\n")
-              image_url = wiki_url + name
-              
-              # download as a stream to overcome output buffer limits at server
-        
-              response = requests.get(image_url, stream=True)
-              image_file_location = download_path + name
-        
-              if response.status_code == 200:
-                  with open(image_file_location, 'wb') as image_outfile:
-                      for chunk in response.iter_content(chunk_size=8192):
-                          image_outfile.write(chunk)
-                  image_outfile.close()
-                  outfile.write(image_url)
-                  outfile.write(" downloaded successfully\n")
-                  print(image_url," downloaded successfully")
-                  outfile.write(name)
-                  outfile.write(" saved\n")
-              else:
-                  outfile.write(image_url)
-                  outfile.write(" could not be accessed (" + pagetitle + ")\n")
-                  print(image_url," could not be accessed (" + pagetitle + ")")
+           outfile.write(name)
+           outfile.write(" is not in the media files folder\n")
+           media_downloader.add(name, pagetitle)     # download in background (media_download.py)
      
-  media = extract_media_files(pagetext)
-  sort_media = sorted(media)
+  sort_media = sorted(record["media"])
   
   # check to see if any of the referenced media files is not in the images folder
   for name in sort_media:
-     name = replace_underscore(name)
-     name = unquote(name)
-
-     # create / append description file    
-     description = "used in " + pagetitle + "\n"
-     if desc_write: 
-       descfile = open(description_folder + name + ".txt", "a")            # open description file to append
-       descfile.write(description)
-       descfile.close()
+     name = percent_decode(replace_underscore(name))
+     media_usage.add(name, pagetitle)          # for the description file
 
-
-     if name not in media_file_list:
+     if media_inventory.discover(name):
          missing_media_files += [name]   
-         media_file_list += [name]
    
     
          if download:
-           if name not in media_file_list:
-              outfile.write(name)
-              outfile.write(" is not in the images folder\n")
-              media_url = wiki_url + name
-              
-              # download as a stream to overcome output buffer limits at server
-        
-              response = requests.get(media_url, stream=True)
-              media_file_location = download_path + name
-        
-              if response.status_code == 200:
-                  with open(media_file_location, 'wb') as media_outfile:
-                      for chunk in response.iter_content(chunk_size=8192):
-                          media_outfile.write(chunk)
-                  media_outfile.close()
-                  outfile.write(media_url)
-                  outfile.write(" downloaded successfully\n")
-                  print(media_url," downloaded successfully")
-                  outfile.write(name)
-                  outfile.write(" saved\n")
-              else:
-                  outfile.write(media_url)
-                  outfile.write(" could not be accessed (" + pagetitle + ")\n")
-                  print(media_url," could not be accessed (" + pagetitle + ")")
+           outfile.write(name)
+           outfile.write(" is not in the images folder\n")
+           media_downloader.add(name, pagetitle)     # download in background (media_download.py)
   
   outfile.write("\n")
-  return media_file_list
+  return
 
-#====================================================================================================
+#=====================================================================================================
 #
-# Function to generate a list of categories sorted by order in the category_list file
+# function to return the settings of a site - the settings at the top of this file, with those
+# given for the site in the sites list in their place
 #
-def category_sort(cats, categories):
-  #print(cats)
-  
-  c_list = []
-  cnum = 0
-  
-  for cat in cats:
-    cnum = 0
-    if len(cat) == 1:
-      c_list += [(0,cat)]
-    else:  
-      for category in categories:
-        cat = re.sub("_"," ",cat)
-        if str.lower(category) == str.lower(cat):
-           c_list += [(cnum,cat)]
-        cnum += 1   
- 
-  sort_list = sorted(c_list, key=lambda x: x[0])
-  sorted_cat_string = ""
-  for cat in sort_list:
-    catstr = cat[1]
-    sorted_cat_string = sorted_cat_string + catstr + "; "
-  return(sorted_cat_string)
-
-
-
-
-
+def site_settings(site_config):
+  site = {"log_folder": ""}
+  for name in site_setting_names:
+    site[name] = site_config.get(name, globals()[name])
+  if "folder_path" in site_config and "media_folders" not in site_config:
+    site["media_folders"] = [site["folder_path"]]      # media folder of this site, not of the default site
+  site["name"] = site_config.get("name", site["xml_data_file"])
+  return site
 
 
+#=====================================================================================================
 #
-# Main XML file processing code
+# function to process the XML file of one site and write its sitemap and other outputs
 #
-
-
-# Read XML file into string "filetext"
-
-with open(xml_data_file, 'rb') as file:
-    content = file.read()
-    filetext = content.decode('utf-8')
-file.close()
-
-# Read categories list
-category_list = read_list_file(categories_file_name)
-# Read media file list
-media_file_list = read_list_file(media_file_list_name)
+# site is a dictionary of settings (see site_settings), and category_rank the categories list
+# ranking (shared by all sites). Pages are processed in a pool of worker processes (none if
+# workers is 0). media_store is the media store shared by all sites, or None. Returns the page
+# counts.
+#
+def build_sitemap(site, category_rank, workers, media_store = None, quiet = False):
+  # settings of this site (see site_settings)
+  xml_data_file = site["xml_data_file"]
+  site_URL = site["site_URL"]
+  wiki_url = site["wiki_url"]
+  folder_path = site["folder_path"]
+  download_path = site["download_path"]
+  description_folder = site["description_folder"]
+  wkg_folder = site["wkg_folder"]
+  wiki_table_file = site["wiki_table_file"]
+  pages_file_name = site["pages_file_name"]
+  csv_file_name = site["csv_file_name"]
+  page_cache_file_name = site["page_cache_file_name"]
+  report_file_name = site["report_file_name"]
+  media_file_list_name = site["media_file_list_name"]
+  media_folders = site["media_folders"]
+  media_folder_cache_name = site["media_folder_cache_name"]
+  media_hash_cache_name = site["media_hash_cache_name"]
+  media_audit_file_name = site["media_audit_file_name"]
+  subpages_folder_name = site["subpages_folder_name"]
+  sitemap_page_name = site["sitemap_page_name"]
+  search_index_file_name = site["search_index_file_name"]
+  link_graph_file_name = site["link_graph_file_name"]
+  link_report_file_name = site["link_report_file_name"]
+  media_usage_file_name = site["media_usage_file_name"]
+  descriptions_file_name = site["descriptions_file_name"]
+  publish_site = site["publish_site"]
+  log_folder = site["log_folder"]
+
+  report = RunReport()                                               # phase timings and counters (run_report.py)
+  report.phase("media_inventory")
+  outfile = open(log_folder + "sitemap_log.txt","w",encoding="utf-8")   # log file reporting all operations completed
+
+  # Get a list of all image and media files already in the local media folders, including PDFs
+  # (path, size, modification time) - only folders changed since the last run are read again
+  folder_files = scan_media_folders(media_folders, wkg_folder + media_folder_cache_name)
+
+  # Print the number of files in the folder
+  nfiles = len(folder_files)
+  outfile.write("Media folder contains ")
+  outfile.write(str(nfiles))
+  outfile.write(" files\n\n")
+
+  # Build inventory of media files available locally - from the media file list, then the media folder
+  media_inventory = MediaInventory()
+  if media_file_list_name != "":
+    for file_name in read_list_file(media_file_list_name):
+      media_inventory.add(file_name, "list")
+  for file_path, file_size, file_mtime in folder_files:
+    media_inventory.add(os.path.basename(file_path), "folder")
  
-# Process the file, page by page
-
-remaining_file_text = filetext
-pages_list = extract_page_names(filetext)
-new_file_text = ""
-page_data = True
-ppages = []
-opages = []
-plpages = []
-mpages = []
-namespace = ""
-categories = ""
-name = ""
-n_ppages = 0
-n_opages = 0
-n_mpages = 0
-n_plpages = 0
-bad_links = []
-numpage = 0
-
-while page_data:
-  print("Page ",str(numpage),"\r",end='')
-  numpage += 1
-  bad_link_list = []
-  page_match = re.search(r'<page>(.+?)</page>', remaining_file_text, re.DOTALL)     # find next page
-  if page_match:                                       
-    page_data = True                                                           # there is a page
-    page_text = page_match.group(1)
-    remainder = remaining_file_text[:page_match.start()]                       # string up to just before start of <page>
-    remaining_file_text = remaining_file_text[page_match.end():]               # discard this text from remaining text
-
-    title_match = re.search(r'<title>(.+?)</title>',page_text)                  # title defined?
-    if title_match:
-      pagetitle = title_match.group(1)                                         # retrieve page title
-      newpagetitle = reformat(pagetitle)                                       # reformat
-        
-      # remove any instances of a space character from between "File:" and filename in XML text, also for media references   
-      page_text = re.sub('File: ', 'File:', page_text, flags=re.IGNORECASE)
-      new_page_text = re.sub('Media: ', 'Media:', page_text, flags=re.IGNORECASE)
-  
-      # standardise case for instances of "File:"
-      page_text = re.sub('File:', 'File:', page_text, flags=re.IGNORECASE)
-      page_text = re.sub('Media:', 'Media:', page_text, flags=re.IGNORECASE)
-      page_text = re.sub('ProFile:', 'Profile:', page_text, flags=re.IGNORECASE)  # restore instances of "Profile"!
-  
+  # Media files missing from the inventory are queued for download and fetched by a pool of threads
+  # (or linked from the media store, if it has the same content)
+  if media_store != None and download:
+    store_files = []
+    for file_path, file_size, file_mtime in scan_media_folders([download_path]):
+      if not file_path.endswith(".part") and not file_path.endswith(".link") and os.path.basename(file_path) != manifest_file_name:
+        store_files += [(file_path, file_size, file_mtime)]
+    report.count("media_stored", media_store.import_files(site["name"], store_files))   # files downloaded before the store was used
+  # (a requests session for each site - the downloader sizes the connection pool of its session)
+  session = requests.Session()
+  media_downloader = MediaDownloader(wiki_url, download_path, session, outfile, download_workers, download_host_limit,
+                                     store = media_store, site = site["name"])
+
+  report.phase("page_index")
+  pages_list = extract_page_names(xml_data_file)
+  page_lookup = title_lookup(pages_list)           # page titles lookup table for link checks
+  link_graph = LinkGraph(pages_list)               # links between pages, added as the pages are processed
+  ppages = []
+  opages = []
+  plpages = []
+  mpages = []
+  n_ppages = 0
+  n_opages = 0
+  n_mpages = 0
+  n_plpages = 0
+  bad_links = []
+  numpage = 0
+  media_usage = MediaUsage()     # pages using each image and media file (description files and media audit)
+
+  # Pages unchanged since the last run are given their cached page record and not scanned again
+  report.phase("pages")
+  page_cache = {}
+  if use_page_cache:
+    page_cache = load_page_cache(wkg_folder + page_cache_file_name)
+  new_page_cache = {}
+  cache_counts = {}
+  pages = cached_pages(iter_pages(xml_data_file), page_cache, cache_counts)
+
+  # Process the file, page by page - in a pool of worker processes if workers is more than 0.
+  # Results come back in page order, so the output files are the same as when processing one page
+  # at a time. Media files are checked (and downloaded) here, in the main process. Worker processes
+  # are started with spawn, not fork - other sites may be running in threads of this process.
+  if workers > 0:
+    pool = multiprocessing.get_context("spawn").Pool(workers, init_pages, (category_rank, page_lookup))
+    results = pool.imap(process_page, pages, page_chunk_size)
+  else:
+    init_pages(category_rank, page_lookup)
+    pool = None
+    results = map(process_page, pages)
+
+  for result in results:
+    if not quiet:
+      print("Page ",str(numpage),"\r",end='')
+    numpage += 1
+    report.page(result["title"], result["record"]["namespace"], result["size"], result["seconds"])
+    report.count("media_references", len(result["files"]) + len(result["media"]))
+    report.count("bad_links", len(result["bad_links"]))
+    report.count("regex_passes", result["counts"]["regex_passes"])     # pattern searches scanning the page (page_scan.py)
+    report.count("link_lookups", result["counts"]["link_lookups"])
+    if result["title"] != "":
       #  download media files not already available       
-      media_file_list = download_media(page_text, newpagetitle, download, media_file_list)
- 
-      # log file
-      outfile.write("Processing page " + pagetitle + "\n")
-
-      # extract info from page depending on namespace value
-      namespace_match = re.search(r'<ns>(.+?)</ns>',page_text)
-      timestamp_match = re.search(r'<timestamp>(.+?)</timestamp>',page_text)
-      redirect_match = re.search(r'#REDIRECT', page_text)
-      
-      if namespace_match:
-        namespace = namespace_match.group(1)
-      else:
-        outfile.write("No namespace found\n")
-      if timestamp_match:
-        timestamp = timestamp_match.group(1)
-      else:
-        timestamp = "none"
-      retain_page = False
-      
-      # look for person pages
-      if namespace == "3000" or namespace == "3002":
-        person_match = re.search('Person:',newpagetitle)  # ensure family name first
-        if not person_match:
-          person_match = re.search('Profile:',newpagetitle)  # ensure family name first
-        if person_match:
-          name = newpagetitle[person_match.end():]
-          retain_page = True
-          n_ppages += 1
-        else:
-          outfile.write("No Person: or Profile: text found\n")
-          name = "--"
-        
-        # look for categories
-        remaining_page_text = page_text
-        categories = []
-        page_wiki_opening = re.search(r"<text.*?>", remaining_page_text, re.DOTALL) # search for <text ....> string
-        if page_wiki_opening:
-          wikitext = page_text[page_wiki_opening.end():]
-          remaining_page_text = re.sub(r'\&lt\;pre\&gt\;(.+?)\&lt\;\/pre\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <pre> .... </pre> text segments
-          remaining_page_text = re.sub(r'\&lt\;nowiki\&gt\;(.+?)\&lt\;\/nowiki\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <nowiki> .... </nowiki> text segments
-          #print(remaining_page_text)
-          remaining_page_text = wikitext
-          life_span = lifespan(remaining_page_text)
-          category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-          while category_match:
-            remaining_page_text = remaining_page_text[category_match.end():]
-            categories += [category_match.group(1)]
-            category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-        
-          cat_string = ""
-          if len(categories) > 0:
-            cat_string = category_sort(categories, category_list)
-
-          bad_link_list = check_links(wikitext, pagetitle, download, pages_list)
-
-        else:
-          chars = len(page_text)
-          if chars > 800:
-             out_text = page_text[0:800]
-          else:
-             out_text = page_text
-          outfile.write("No text opening found:" + out_text + "\n\n")
-
-        page_entry = (newpagetitle + "|" + pagetitle + "|" + cat_string + "|" + timestamp_mon_year(timestamp) + "|" + life_span )
-        ppages += [page_entry]
-        outfile.write(page_entry + "\n")
-      
-      elif namespace == "3008":   # organization pages
-      
-        org_match = re.search('Organisation:',pagetitle)  
-        if org_match:
-          oname = newpagetitle[org_match.end():]
-          retain_page = True
-          n_opages += 1
-        else:
-          outfile.write("No Organisation: text found\n")
-          oname = "--"
-        
-        # look for categories
-        remaining_page_text = page_text
-        remaining_page_text = re.sub(r'\&lt\;pre\&gt\;(.+?)\&lt\;\/pre\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <pre> .... </pre> text segments
-        remaining_page_text = re.sub(r'\&lt\;nowiki\&gt\;(.+?)\&lt\;\/nowiki\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <nowiki> .... </nowiki> text segments
-        #print(remaining_page_text)
-        life_span = lifespan(remaining_page_text)
-        categories = []
-        page_wiki_opening = re.search(r"<text.*?>", remaining_page_text, re.DOTALL) # search for <text ....> string
-        if page_wiki_opening:
-          wikitext = page_text[page_wiki_opening.end():]
-          remaining_page_text = wikitext
-          category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-          while category_match:
-            remaining_page_text = remaining_page_text[category_match.end():]
-            categories += [category_match.group(1)]
-            category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-        
-          cat_string = ""
-          if len(categories) > 0:
-            cat_string = category_sort(categories, category_list)
-          
-          bad_link_list = check_links(wikitext, pagetitle, download, pages_list)
-        
-        
-        
-        else:
-          chars = len(page_text)
-          if chars > 800:
-             out_text = page_text[0:800]
-          else:
-             out_text = page_text
-          outfile.write("No text opening found:" + out_text + "\n\n")
-
-        page_entry = (newpagetitle + "|" + pagetitle + "|" + cat_string + "|" + timestamp_mon_year(timestamp) + "|" + life_span)
-        opages += [page_entry]
-        outfile.write(page_entry + "\n")
-      
-      elif namespace == "3004":   # place pages
-      
-        place_match = re.search('Place:',pagetitle)  
-        if place_match:
-          plname = newpagetitle[place_match.end():]
-          retain_page = True
-          n_plpages += 1
-        else:
-          outfile.write("No Place: text found\n")
-          plname = "--"
-        
-        # look for categories
-        remaining_page_text = page_text
-        categories = []
-        page_wiki_opening = re.search(r"<text.*?>", remaining_page_text, re.DOTALL) # search for <text ....> string
-        if page_wiki_opening:
-          remaining_page_text = page_text[page_wiki_opening.end():]
-          remaining_page_text = re.sub(r'\&lt\;pre\&gt\;(.+?)\&lt\;\/pre\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <pre> .... </pre> text segments
-          remaining_page_text = re.sub(r'\&lt\;nowiki\&gt\;(.+?)\&lt\;\/nowiki\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <nowiki> .... </nowiki> text segments
-          #print(remaining_page_text)
-          wikitext = remaining_page_text
-          category_match = re.search(r'\[\[Category:(.+?)]\]', remaining_page_text, flags=re.IGNORECASE)
-          while category_match:
-            remaining_page_text = remaining_page_text[category_match.end():]
-            categories += [category_match.group(1)]
-            category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-        
-          cat_string = ""
-          if len(categories) > 0:
-            cat_string = category_sort(categories, category_list)
-
-          bad_link_list = check_links(wikitext, pagetitle, download, pages_list)
-
-
-        else:
-          chars = len(page_text)
-          if chars > 800:
-             out_text = page_text[0:800]
-          else:
-             out_text = page_text
-          outfile.write("No text opening found:" + out_text + "\n\n")
-
-        page_entry = (newpagetitle + "|" + pagetitle + "|" + cat_string+ "|" + timestamp_mon_year(timestamp))
-        plpages += [page_entry]
-        outfile.write(page_entry + "\n")
-      
-      elif namespace == "0":   # place pages
-        retain_page = False
-        if redirect_match:
-          retain_page = False
-        elif re.search('Css:',pagetitle):
-          retain_page = False
-        elif re.search('Forum:',pagetitle):  
-          retain_page = False
-        elif re.search('Home:',pagetitle):  
-          retain_page = False
-        elif re.search('Includepopup:',pagetitle):  
-          retain_page = False
-        elif re.search('Includes:',pagetitle):  
-          retain_page = False
-        elif re.search('Legal:',pagetitle):  
-          retain_page = False
-        elif re.search('Main:',pagetitle):  
-          retain_page = False
-        elif re.search('Maps Home',pagetitle):  
-          retain_page = False
-        elif re.search('Popuptes:',pagetitle):  
-          retain_page = False
-        elif re.search('Search:',pagetitle):  
-          retain_page = False
-        elif re.search('Sitema:',pagetitle):  
-          retain_page = False
-        elif re.search('System:',pagetitle):  
-          retain_page = False
-        elif re.search('Tes:',pagetitle):  
-          retain_page = False
-        elif re.search('Events:',pagetitle):  
-          retain_page = False
-        elif re.search('Help:',pagetitle):  
-          retain_page = False
-        elif re.search('Sitemap',pagetitle):
-          retain_page = False
-        else:  
-          retain_page = True
-          n_mpages += 1
-        
-        # look for categories
-        remaining_page_text = page_text
-        categories = []
-        page_wiki_opening = re.search(r"<text.*?>", remaining_page_text, re.DOTALL) # search for <text ....> string
-        if page_wiki_opening:
-          remaining_page_text = page_text[page_wiki_opening.end():]
-          remaining_page_text = re.sub(r'\&lt\;pre\&gt\;(.+?)\&lt\;\/pre\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <pre> .... </pre> text segments
-          remaining_page_text = re.sub(r'\&lt\;nowiki\&gt\;(.+?)\&lt\;\/nowiki\&gt\;', '', remaining_page_text, flags = re.DOTALL | re.IGNORECASE | re.MULTILINE)  # remove <nowiki> .... </nowiki> text segments
-          #print(remaining_page_text)
-          wikitext = remaining_page_text
-          
-          category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-          while category_match:
-            remaining_page_text = remaining_page_text[category_match.end():]
-            categories += [category_match.group(1)]
-            category_match = re.search(r'\[\[Category:(.+?)\]\]', remaining_page_text, flags=re.IGNORECASE)
-        
-          cat_string = ""
-          if len(categories) > 0:
-            cat_string = category_sort(categories, category_list)
-
-          bad_link_list = check_links(wikitext, pagetitle, download, pages_list)
-
-        else:
-          chars = len(page_text)
-          if chars > 800:
-             out_text = page_text[0:800]
-          else:
-             out_text = page_text
-          outfile.write("No text opening found:" + out_text + "\n\n")
-
-        page_entry = (newpagetitle + "|" + pagetitle + "|" + cat_string + "|" + timestamp_mon_year(timestamp))
-        if retain_page:
-          mpages += [page_entry]
-        outfile.write(page_entry + "\n")
-      
-        for link in bad_link_list:
-          bad_links += [link] 
-        bad_link_list = []
-  
-       
-
-    else: # no title match
-      outfile.write("Page without title: suspect error\n")
-      
-    
-    
-  else: # no page match
-    page_data = False
+      download_media(result, result["newtitle"], download, media_inventory, media_usage, media_downloader, outfile)
+    outfile.write(result["log"])
+
+    # add page entry to the list for its namespace
+    if result["list"] == "ppages":
+      ppages += [result["entry"]]
+      if result["retain"]:
+        n_ppages += 1
+    elif result["list"] == "opages":
+      opages += [result["entry"]]
+      if result["retain"]:
+        n_opages += 1
+    elif result["list"] == "plpages":
+      plpages += [result["entry"]]
+      if result["retain"]:
+        n_plpages += 1
+    elif result["list"] == "mpages":
+      mpages += [result["entry"]]
+      n_mpages += 1
+    bad_links += result["bad_links"]
+    link_graph.add_links(result["title"], result["links"])
+    if result["title"] != "" and result["record"]["has_text"]:
+      new_page_cache[result["title"]] = [result["checksum"], result["record"]]
+
+  if pool != None:
+    pool.close()
+    pool.join()
+
+  save_page_cache(wkg_folder + page_cache_file_name, new_page_cache)     # deleted pages are dropped
+  outfile.write("Pages: " + str(cache_counts["scanned"]) + " scanned, " + str(cache_counts["cached"]) + " unchanged since the last run\n")
+  report.count("pages", numpage)
+  report.count("pages_scanned", cache_counts["scanned"])
+  report.count("regex_passes", cache_counts["regex_passes"])          # page heads read for the page cache
+  report.count("pages_cached", cache_counts["cached"])
+
+  report.phase("link_graph")
+  link_graph.finish()
+  link_graph.save(wkg_folder + link_graph_file_name)
+  report.count("page_links", link_graph.edges())
+
+  report.phase("sort")
+
+  # Sort lists into sitemap order - see PageEntry in sitemap_pages.py for the sort keys
+  ppages.sort(key = lambda entry: entry.sort_key)
+  opages.sort(key = lambda entry: entry.sort_key)
+  plpages.sort(key = lambda entry: entry.sort_key)
+  mpages.sort(key = lambda entry: entry.sort_key)
+
+  # Render the wiki table, spreadsheet and pages list in one pass over each list (sitemap_render.py)
+  report.phase("render")
+  sitemap = render_sitemap(xml_data_file, site_URL, mpages, ppages, opages, plpages, bad_links)
+  outfile.write(sitemap["log"])
+
+  report.phase("write")
+  with open(wkg_folder + pages_file_name, "w", encoding="utf-8") as pages_file:
+    pages_file.write(sitemap["pages"])
+  with open(wkg_folder + wiki_table_file, "w", encoding="utf-8") as wiki_tab:
+    wiki_tab.write(sitemap["wiki"])
+  with open(wkg_folder + csv_file_name, "w", encoding="utf-8") as csv_file:
+    csv_file.write(sitemap["csv"])
+
+  if split_sitemap:
+    # index page and subpages - only the subpages which have changed since the last run are written
+    subpages = render_subpages(xml_data_file, site_URL, mpages, ppages, opages, plpages, bad_links, sitemap_page_name)
+    changed, removed = save_subpages(wkg_folder + subpages_folder_name, subpages)
+    outfile.write("Sitemap subpages: " + str(len(subpages)) + " pages, " + str(len(changed)) + " changed, " + str(len(removed)) + " removed\n")
+    for page_name in changed:
+      outfile.write("subpage changed: " + page_name + "\n")
+    for page_name in removed:
+      outfile.write("subpage removed: " + page_name + "\n")
+    report.count("subpages", len(subpages))
+    report.count("subpages_changed", len(changed))
+
+  if search_index:
+    # names, categories and word postings of every page in the sitemap, in sitemap order
+    report.phase("search_index")
+    entries = [(entry, display_name(entry.name)) for entry in mpages + ppages + opages + plpages]
+    save_search_index(wkg_folder + search_index_file_name, build_search_index(entries, xml_data_file))
+    report.count("search_index_pages", len(entries))
+
+  # orphan and dead-end pages are only reported for pages in the sitemap
+  orphans, dead_ends = write_link_report(wkg_folder + link_report_file_name, link_graph,
+                                         [entry.title for entry in mpages + ppages + opages + plpages])
+  outfile.write("Link graph: " + str(link_graph.edges()) + " links, " + str(len(orphans)) + " orphan pages, " + str(len(dead_ends)) + " dead-end pages\n")
+
+  if publish:
+    # save the sitemap on the wiki - the index page and subpages if split, otherwise the one page
+    report.phase("publish")
+    if split_sitemap:
+      publish_set = subpages
+    else:
+      publish_set = {sitemap_page_name: sitemap["wiki"]}
+    publish_log = []
+    counts = publish_pages(publish_set, "Sitemap update from " + xml_data_file, publish_log, publish_site)
+    outfile.write("".join(publish_log))
+    outfile.write("Published: " + str(counts["changed"]) + " of " + str(counts["pages"]) + " pages changed (" +
+                  str(counts["sections"]) + " sections), " + str(counts["failed"]) + " failed\n")
+    for name in ["pages", "changed", "failed", "sections"]:
+      report.count("publish_" + name, counts[name])
+
+  if download:
+    report.phase("downloads")
+    summary = media_downloader.finish()         # wait for media downloads to complete
+    for name in ["queued", "downloaded", "resumed", "unchanged", "linked", "failed", "bytes"]:
+      report.count("media_" + name, summary[name])
+  session.close()
+
+  # media usage index, and the description files which have changed since the last run
+  report.phase("media_usage")
+  media_usage.save(wkg_folder + media_usage_file_name)
+  if desc_write:
+    # compared with the index saved when the description files were last written (not the media
+    # usage index, which is saved by every run)
+    previous_usage = load_media_usage(wkg_folder + descriptions_file_name)
+    written, removed = write_descriptions(description_folder, media_usage, previous_usage)
+    outfile.write("Description files: " + str(written) + " written, " + str(removed) + " removed\n")
+    report.count("descriptions_written", written)
+    media_usage.save(wkg_folder + descriptions_file_name)
+  report.count("media_used", len(media_usage))
+
+  if media_audit:
+    # hash every file in the media and download folders (only new or changed files are read) and
+    # report groups of files with the same content
+    report.phase("media_audit")
+    audit_files = []
+    for file_path, file_size, file_mtime in scan_media_folders([folder_path, download_path], wkg_folder + media_folder_cache_name):
+      if not file_path.endswith(".part") and os.path.basename(file_path) != manifest_file_name:   # incomplete download or manifest
+        audit_files += [file_path]          # size and modification time read again by hash_files
+    media_hashes = hash_files(audit_files, wkg_folder + media_hash_cache_name, hash_workers)
+    duplicates = duplicate_groups(media_hashes)
+    write_audit(wkg_folder + media_audit_file_name, duplicates, media_hashes, media_usage.references())
+    outfile.write(str(len(duplicates)) + " groups of duplicate media files - see " + media_audit_file_name + "\n")
+    report.count("media_hashed", len(media_hashes))
+    report.count("media_duplicate_groups", len(duplicates))
+
+  outfile.write("Media files: " + str(media_inventory.count("list")) + " in media file list, " + str(media_inventory.count("folder")) + " in media folder, " + str(media_inventory.count("new")) + " newly referenced\n")
+
+  outfile.close()
+
+  outfile = open(log_folder + "new_media_file_list.txt","w",encoding="UTF-8")
+  for file_name in media_inventory.names():
+    outfile.write(file_name + "\n")
+  outfile.close()
+
+  outfile = open(log_folder + "bad_links_list.txt","w",encoding="UTF-8")
+  for link in bad_links:
+    outfile.write(link + "\n")
+  outfile.close()
 
+  report.count("media_new", media_inventory.count("new"))
+  report.save(wkg_folder + report_file_name)
+  return {"ppages": n_ppages, "opages": n_opages, "plpages": n_plpages, "mpages": n_mpages,
+          "duplicates": len(duplicates) if media_audit else 0}
 
 
+#=====================================================================================================
 #
-# Sort and scan lists for letter breaks - where first letter changes - for top of page index bar
-# noting that ppages list has "profile:" and "person:" entries
+# function to print the page counts of a site
 #
+def print_counts(counts, prefix = ""):
+  print(prefix + str(counts["ppages"])," person (biography) pages\n")
+  print(prefix + str(counts["opages"])," organisation pages\n")
+  print(prefix + str(counts["plpages"])," place pages\n")
+  print(prefix + str(counts["mpages"])," top-level or unclassified pages\n")
+  if media_audit:
+    print(prefix + str(counts["duplicates"]) + " groups of duplicate media files - see " + media_audit_file_name + "\n")
 
-temp_list=[]
-for page in ppages:
-  items = separate_text(r'\|',page)
-  if items[0] != "":  # in case of blank entries
-    names = separate_text(":",items[0])
-    temp_list += [names[1] + "|" + page]  # extract full name and add to start of page entry for sort purposes
-temp_list = sorted(temp_list)
-
-ppages = []
-for page in temp_list:
-  items = separate_text(r'\|',page)
-  page_entry = items[1] + "|" + items[2] + "|" + items[3] + "|" + items[4] + "|" + items[5]  
-  ppages += [page_entry]
-
-# rest can easily be sorted as they are
-
-opages = sorted(opages)
-plpages = sorted(plpages)
-mpages = sorted(mpages)
-
-previous_letter = ""
-person_breaks = []
-breaks = []
-npage = 0
-for page in ppages:
-  npage += 1
-  text = re.sub("Person:","",page)
-  text = re.sub("Profile:","",page)
-  text = re.sub("Place:","",text)
-  text = re.sub("Organisation:","",text)
-  first_letter = text[0]
-  if first_letter != previous_letter:
-    person_breaks += [first_letter]
-    breaks += [npage]
-    previous_letter = first_letter
-
-
-# Generate wikitable from pages list, also pages listing file
-pages_file = open(wkg_folder + pages_file_name,"w",encoding="utf-8")
-
-for page in mpages:
-  pages_file.write(page + "\n")
-
-
-# Open wiki table and processed pages file - write
-wiki_tab = open(wkg_folder + wiki_table_file, 'w',encoding="utf-8")
-csv_file = open(wkg_folder + csv_file_name, 'w', encoding="utf-8")
-
-wiki_tab.write("==Sitemap from " + xml_data_file + "==\n\n")
-wiki_tab.write("| [[#Biographies|Biographies]] | [[#Organisations|List of Organisations]]  |  [[#Places|List of Places]] |\n\n")
-
-
-
-# main pages - tabbed by states
-
-wiki_tab.write("\n\n\n==Top Level Pages by State==\n\n")
-csv_file.write("\n\n==Top Level Pages by State=\n\n")
-states = ['National','Australian Capital Territory','New South Wales','Northern Territory','Queensland','South Australia','Victoria','Tasmania','Western Australia']
-
-#open tabs
-wiki_tab.write("<tabs>\n")
-
-for state in states:
-  wiki_tab.write("<tab name=\"" + state + "\">\n")
-
-  wiki_tab.write("{| class = wikitable style=color:blue;")
-  wiki_tab.write(" background-color:##ffcfcf; callpadding=5; width=100% \n")
-  wiki_tab.write("\n! page !! categories !! timestamp \n")  # table header
-  csv_file.write("\n\n" + state + "\t categories \t timestamp \t\n\n")
-
-  for page in mpages:
-    page_match = re.search(r'\|',page)
-    mname = page[:page_match.start()]
-    remaining_text = page[page_match.end():]
-    cat_match = re.search(r'\|', remaining_text)
-    pagetitle = remaining_text[:cat_match.start()]
-    remaining_text = remaining_text[cat_match.end():]
-    ts_match = re.search(r'\|', remaining_text)
-    cat = remaining_text[:ts_match.start()]
-    ts = remaining_text[ts_match.end():]
-    
-    state_loc = re.search(state,cat)  # if state found in categories
-    
-    show = False
-    if state_loc:
-      show = True
-    else:                             # otherwise if none of the states is listed in categories...list under No State
-      if state == 'National':
-        show = True
-        for state_i in states:
-          state_loc1 = re.search(state_i,cat)
-          if state_loc1:
-            show = False
-            
-    #print("cat:",state,state_loc,show,state_loc1,cat)
-    if show:
-   
-      # add entry to wiki-table.txt file - names have to be in double quotes for Excel to ignore commas in names
-      wiki_tab.write("|-\n| " + "[" + site_URL + re.sub(" ","_",pagetitle) + " " + mname + " ] ||")
-      wiki_tab.write(" " + cat + "||" + ts + "\n")
-      csv_file.write(pagetitle + "\t" + mname + "\t" + cat + "\t" + ts + "\n")
-      outfile.write("page:" + page + "|" + mname + "|" + pagetitle + "|" + cat + "|" + ts + "\n")
-
-  wiki_tab.write("|}\n\n") # end table  
-  wiki_tab.write("</tab>\n")
-
-wiki_tab.write("</tabs>\n")
-
-
-
-
-
-# People Pages
-wiki_tab.write("==Biographies==\n\n")
-csv_file.write("==Biographies==\n\n")
-top_links = False
-
-previous_letter = ""
-page_breaks = []
-breaks = []
-npage = 0
-for page in ppages:
-  npage += 1
-  text = re.sub("Person:","",page)
-  text = re.sub("Place:","",text)
-  text = re.sub("Profile:","",text)
-  text = re.sub("Organisation:","",text)
-  first_letter = text[0]
-  if first_letter != previous_letter:
-    page_breaks += [first_letter]
-    breaks += [npage]
-    previous_letter = first_letter
-
-
-if top_links:
-  # write line of letter group links  [[#Names A| A ]] | [[#Names B| B ]]
-  first = True
-  for letter in breaks:
-    if not first:
-      wiki_tab.write("|")
-    wiki_tab.write("[[#" + letter + " Names|" + letter + "]]")
-    first = False
-
-  wiki_tab.write("\n\n")
-else:
-  #open tabs
-  wiki_tab.write("<tabs>\n")
-  
-
-
-first = True
-npage = 0
-for page in ppages:
-  pages_file.write(page + "\n")
-  npage += 1
-
-  page_match = re.search(r'\|',page)
-  name = page[:page_match.start()]
-  remaining_text = page[page_match.end():]
-
-  cat_match = re.search(r'\|', remaining_text)
-  pagetitle = remaining_text[:cat_match.start()]
-  remaining_text = remaining_text[cat_match.end():]
-
-  ts_match = re.search(r'\|', remaining_text)
-  cat = remaining_text[:ts_match.start()]
-  remaining_text = remaining_text[ts_match.end():]
-
-  ls_match = re.search(r'\|', remaining_text)
-  if ls_match:
-    ts = remaining_text[:ls_match.start()]
-    remaining_text = remaining_text[ls_match.end():]
-    ls = remaining_text                # life span if present
-    #print(ls)
-    if len(ls)>3:
-      ls = " (" + ls + ")"
-  else:  
-    ts = remaining_text[ts_match.end():]
-    ls = ""
-    
-  text = re.sub("Person:","",name)
-  text = re.sub("Profile:","",text)
-  text = re.sub("Place:","",text)
-  text = re.sub("Organisation:","",text)
-
-  outfile.write("page:" + page + "|==|" + text + "|" + pagetitle + "|" + cat + "|" + ts + "\n")
-
-  if npage in breaks:
-    if not first:
-      wiki_tab.write("|}\n\n") # end table
-      if not top_links:
-        wiki_tab.write("</tab>\n")
-        
-    first = False  
-    if top_links:
-      wiki_tab.write("==" + name[0] + " Names==\n\n")  # write heading text
-    else:
-      wiki_tab.write("<tab name=\"" + text[0] + "\">\n")
-        
-    wiki_tab.write("{| class = wikitable style=color:black;")
-    wiki_tab.write(" background-color:##cfcfcf; callpadding=5; width=100% \n")
-    wiki_tab.write("\n! name !! life-span !! categories !! timestamp \n")  # table header
-  
-  # add entry to wiki-table.txt file - names have to be in double quotes for Excel to ignore commas in names
-  wiki_tab.write("|-\n| " + "[" + site_URL + re.sub(" ","_",pagetitle) + " " + text + " ] || " + ls + " ||")
-  wiki_tab.write(" " + cat + "||" + ts + "\n")
-  csv_file.write(pagetitle + "\t" + text + " " + ls + "\t" + cat + "\t" + ts + "\n")
-
-if top_links:
-  wiki_tab.write("|}\n\n") # end table  
-else:
-  wiki_tab.write("|}\n\n") # end table  
-  wiki_tab.write("</tab>\n</tabs>\n")
-  
-  
-# organisations table - currently not enough for tabs
-
-wiki_tab.write("\n\n\n==Organisations==\n\n")
-csv_file.write("\n\n==Organisations==\n\n")
-
-breaks = [1] # disable tabs
-first = True
-npage = 0
-top_links = True
-
-for page in opages:
-  pages_file.write(page + "\n")
-  npage += 1
-  page_match = re.search(r'\|',page)
-  name = page[:page_match.start()]
-  remaining_text = page[page_match.end():]
-
-  cat_match = re.search(r'\|', remaining_text)
-  pagetitle = remaining_text[:cat_match.start()]
-  remaining_text = remaining_text[cat_match.end():]
-
-  ts_match = re.search(r'\|', remaining_text)
-  cat = remaining_text[:ts_match.start()]
-  remaining_text = remaining_text[ts_match.end():]
-
-  ls_match = re.search(r'\|', remaining_text)
-  if ls_match:
-    ts = remaining_text[:ls_match.start()]
-    remaining_text = remaining_text[ls_match.end():]
-    ls = remaining_text                # life span if present
-    print(ls)
-    if len(ls)>3:
-      ls = " (" + ls + ")"
-  else:  
-    ts = remaining_text
-    ls = ""
-  print(name)
-  text = re.sub("Person:","",name)
-  text = re.sub("Place:","",text)
-  text = re.sub("Organisation:","",text)
-
-  outfile.write("page:" + page + "|==|" + text + "|" + pagetitle + "|" + cat + "|" + ts + "\n")
-  if npage in breaks:
-    if not first:
-      wiki_tab.write("|}\n\n") # end table
-      if not top_links:
-        wiki_tab.write("</tab>\n")
-        
-    first = False  
-    if top_links:
-      #wiki_tab.write("==" + name[0] + " Names==\n\n")  # write heading text
-      wiki_tab.write("\n")
-    else:
-      wiki_tab.write("<tab name=\"" + name[0] + "\">\n")
-        
-    wiki_tab.write("{| class = wikitable style=color:blue;")
-    wiki_tab.write(" background-color:##ffcfcf; callpadding=5; width=100% \n")
-    wiki_tab.write("\n! oganisation !! lifespan !! categories !! timestamp \n")  # table header
-  
-  # add entry to wiki-table.txt file - names have to be in double quotes for Excel to ignore commas in names
-  wiki_tab.write("|-\n| " + "[" + site_URL + re.sub(" ","_",pagetitle) + " " + text + " ] ||")
-  wiki_tab.write(ls + " || " + cat + "||" + ts + "\n")
-  csv_file.write(pagetitle + "\t" + text + " " + ls + "\t" + cat + "\t" + ts + "\n")
-
-if top_links:
-  wiki_tab.write("|}\n\n") # end table  
-else:
-  wiki_tab.write("|}\n\n") # end table  
-  wiki_tab.write("</tab>\n</tabs>\n")
-
-
-
-previous_letter = ""
-page_breaks = []
-breaks = []
-npage = 0
-for page in plpages:
-  npage += 1
-  text = re.sub("Person:","",page)
-  text = re.sub("Place:","",text)
-  text = re.sub("Profile:","",text)
-  text = re.sub("Organisation:","",text)
-  first_letter = text[0]
-  if first_letter != previous_letter:
-    page_breaks += [first_letter]
-    breaks += [npage]
-    previous_letter = first_letter
-  
-
-# places table - enough for tabs
-
-wiki_tab.write("\n\n\n==Places==\n\n")
-csv_file.write("\n\n==Places==\n\n")
 
-top_links = False
-
-if top_links:
-  # write line of letter group links  [[#Names A| A ]] | [[#Names B| B ]]
-  first = True
-  for letter in page_breaks:
-    if not first:
-      wiki_tab.write("|")
-    wiki_tab.write("[[#" + letter + " Names|" + letter + "]]")
-    first = False
-
-  wiki_tab.write("\n\n")
-else:
-  #open tabs
-  wiki_tab.write("<tabs>\n")
-
-
-first = True
-npage = 0
-
-
-for page in plpages:
-  pages_file.write(page + "\n")
-  npage += 1
-  page_match = re.search(r'\|',page)
-  plname = page[:page_match.start()]
-  remaining_text = page[page_match.end():]
-  cat_match = re.search(r'\|', remaining_text)
-  pagetitle = remaining_text[:cat_match.start()]
-  remaining_text = remaining_text[cat_match.end():]
-  ts_match = re.search(r'\|', remaining_text)
-  cat = remaining_text[:ts_match.start()]
-  ts = remaining_text[ts_match.end():]
-  text = re.sub("Person:","",plname)
-  text = re.sub("Place:","",text)
-  text = re.sub("Profile:","",text)
-  text = re.sub("Organisation:","",text)
-  
-  outfile.write("page:" + page + "|" + text + "|" + pagetitle + "|" + cat + "|" + ts + "\n")
-  if npage in breaks:
-    if not first:
-      wiki_tab.write("|}\n\n") # end table
-      if not top_links:
-        wiki_tab.write("</tab>\n")
-        
-    first = False  
-    if top_links:
-      wiki_tab.write("==" + plname[0] + " Names==\n\n")  # write heading text
-      wiki_tab.write("\n")
-    else:
-      wiki_tab.write("<tab name=\"" + text[0] + "\">\n")
-        
-    wiki_tab.write("{| class = wikitable style=color:green;")
-    wiki_tab.write(" background-color:##cfffcf; callpadding=5; width=100% \n")
-    wiki_tab.write("\n! place !! categories !! timestamp \n")  # table header
-  
-  # add entry to wiki-table.txt file - names have to be in double quotes for Excel to ignore commas in names
-  wiki_tab.write("|-\n| " + "[" + site_URL + re.sub(" ","_",pagetitle) + " " + text + " ] ||")
-  wiki_tab.write(" " + cat + "||" + ts + "\n")
-  csv_file.write(pagetitle + "\t" + text  + "\t" + cat + "\t" + ts + "\n")
-
-if top_links:
-  wiki_tab.write("|}\n\n") # end table  
-else:
-  wiki_tab.write("|}\n\n") # end table  
-  wiki_tab.write("</tab>\n</tabs>\n")
-
-
-
-#print(bad_links)
-if len(bad_links) > 0:
-  wiki_tab.write("\n\n\n==Possible broken links==\n\n")
-  csv_file.write("\n\n==Possible broken links=\n\n")
-
-  for link in bad_links:
-    bar_loc = re.search(r'\|',link)
-    plink = unquote(link[:bar_loc.start()])
-    pagetitle = unquote(link[bar_loc.end():])
-    wiki_tab.write("[[" + plink + "]] in page [[" + pagetitle + "]]<br>\n")
-    csv_file.write(plink + "\t" + pagetitle + "\n")
-
-print(str(n_ppages)," person (biography) pages\n")
-print(str(n_opages)," organisation pages\n")
-print(str(n_plpages)," place pages\n")
-print(str(n_mpages)," top-level or unclassified pages\n")
-
-pages_file.close()
-wiki_tab.close()
-csv_file.close()
-outfile.close()
+#
+# Main XML file processing code
+#
+# (only when run as a script - worker processes import this file but must not run the main code)
+#
+if __name__ == "__main__":
 
-outfile = open("new_media_file_list.txt","w",encoding="UTF-8")
-for file_name in media_file_list:
-  outfile.write(file_name + "\n")
-outfile.close()
+  # Read categories list - the ranking is shared by all sites
+  category_list = read_list_file(categories_file_name)
+  category_rank = CategoryRank(category_list)      # position of each category, for sorting page categories
 
-outfile = open("bad_links_list.txt","w",encoding="UTF-8")
-for link in bad_links:
-  outfile.write(link + "\n")
-outfile.close()
+  media_store = None
+  if media_store_folder != "":
+    media_store = MediaStore(media_store_folder)   # shared by all sites
 
- 
\ No newline at end of file
+  if len(sites) == 0:
+    counts = build_sitemap(site_settings({}), category_rank, page_workers if page_workers > 1 else 0, media_store)
+    print_counts(counts)
+  else:
+    # sites processed in threads, sharing the name caches (wiki_names.py) and the category ranking -
+    # each site has its own pool of page workers, requests session and outputs
+    n_sites = min(site_workers, len(sites))
+    workers = max(1, page_workers // n_sites)
+    site_list = [site_settings(site_config) for site_config in sites]
+    for site in site_list:
+      site["log_folder"] = site["wkg_folder"]         # log files beside the other outputs of the site
+    with ThreadPoolExecutor(max_workers = n_sites) as site_pool:
+      jobs = [site_pool.submit(build_sitemap, site, category_rank, workers, media_store, True) for site in site_list]
+      for site, job in zip(site_list, jobs):
+        print_counts(job.result(), site["name"] + ": ")
+
+  if media_store != None:
+    store_counts = media_store.counts()
+    print("Media store: " + str(store_counts["names"]) + " file names, " + str(store_counts["blobs"]) + " different files (" +
+          str(store_counts["bytes"]) + " bytes)\n")
+    media_store.close()
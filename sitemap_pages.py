@@ -0,0 +1,306 @@
+'''  sitemap_pages.py
+
+ Page processing for sitemap.py
+
+ process_page takes one page from the XML file (with its cached page record, if any - see
+ page_cache.py) and returns everything sitemap.py needs from that page: the sitemap entry and which list it belongs to, bad links, image and
+ media file references, and the log messages for the page. It does not write to any file, so
+ pages can be processed in a pool of worker processes and the results merged in page order
+ by sitemap.py. These functions are kept out of sitemap.py because worker processes import
+ this module, and must not run the sitemap script itself.
+
+ init_pages must be called first (in each worker process) with the category ranking and the
+ page title lookup table.
+
+ Result dictionary returned by process_page:
+   title       page title ("" if the page has no title)
+   newtitle    reformatted page title (see reformat)
+   files       image file references (see page_scan.py)
+   media       media file references
+   list        "ppages", "opages", "plpages", "mpages" or "" - sitemap list for the entry
+   entry       sitemap entry (PageEntry - see below), or None
+   retain      True if the page is counted in the sitemap
+   bad_links   bad links "link|title" to be reported (main pages only)
+   links       titles of the pages linked to (as in the XML file - see wiki_names.find_title), for
+               the link graph (see link_graph.py)
+   log         log file text for the page
+   checksum    page checksum and
+   record      page record (see page_scan.py) - kept in the page cache for the next run
+   size        size of the page text (0 if taken from the page cache)
+   counts      {"regex_passes": pattern searches made scanning the page (see page_scan.py),
+                "link_lookups": links looked up in the page title lookup table,
+                "bad_links": bad links found (pages in any sitemap namespace)}
+   seconds     time taken to process the page
+
+ Sitemap entries are PageEntry objects, with the fields used for sorting and rendering the
+ sitemap (see sitemap_render.py). entry.text() gives the entry in the form written to the
+ pages list and log file: "name|title|categories|timestamp[|lifespan]".
+
+'''
+import re
+import time
+from wiki_names import find_title, reformat, CategoryRank
+from page_scan import scan_page
+
+category_rank = CategoryRank([])     # position of each category in the categories list (see wiki_names.py)
+page_lookup = {}       # page titles lookup table (see wiki_names.py)
+
+# namespace 0 pages with these strings in the title are not listed in the sitemap
+excluded_titles = ['Css:', 'Forum:', 'Home:', 'Includepopup:', 'Includes:', 'Legal:', 'Main:', 'Maps Home', 'Popuptes:',
+                   'Search:', 'Sitema:', 'System:', 'Tes:', 'Events:', 'Help:', 'Sitemap']
+
+# namespaces of pages listed with a lifespan (biographies and organisations)
+lifespan_namespaces = ["3000", "3002", "3008"]
+
+# namespaces of biographies - their categories are written without a space after the last ";"
+biography_namespaces = ["3000", "3002"]
+
+
+#=====================================================================================================
+#
+# PageEntry class - one sitemap entry
+#
+# namespace    namespace number (text)
+# name         reformatted page title, e.g. "Person:Smith, John" (see reformat)
+# title        page title
+# categories   listed categories of the page, in categories list order
+# timestamp    timestamp of the latest revision as "Mon yyyy"
+# lifespan     lifespan (biographies and organisations only)
+# sort_key     sitemap order - biographies are sorted on the name following "Person:" or
+#              "Profile:", other entries on the entry text
+#
+class PageEntry:
+  __slots__ = ("namespace", "name", "title", "categories", "timestamp", "lifespan", "sort_key")
+
+  def __init__(self, namespace, name, title, categories, timestamp, lifespan):
+    self.namespace = namespace
+    self.name = name
+    self.title = title
+    self.categories = tuple(categories)
+    self.timestamp = timestamp
+    self.lifespan = lifespan
+    self.sort_key = self.text()
+
+  def category_text(self):
+    text = "".join([cat + "; " for cat in self.categories])
+    if self.namespace in biography_namespaces:
+      text = text.rstrip(" ")        # as the biographies list has always been written (fields trimmed when sorted)
+    return text
+
+  def text(self):
+    entry = self.name + "|" + self.title + "|" + self.category_text() + "|" + self.timestamp
+    if self.namespace in lifespan_namespaces:
+      entry += "|" + self.lifespan
+    return entry
+
+
+#=====================================================================================================
+#
+# function to set up the category ranking and page title lookup table (once in each worker process)
+#
+def init_pages(ranking, lookup):
+  global category_rank, page_lookup
+  category_rank = ranking
+  page_lookup = lookup
+
+
+#=====================================================================================================
+#
+# function to convert timestamp format from numeric form to mm-yy
+# 
+# 
+def timestamp_mon_year(text):
+    m = text[5:7]
+    if m == "01":
+      mm = "Jan "
+    elif m == "02":
+      mm = "Feb "
+    elif m == "03":
+      mm = "Mar "
+    elif m == "04":
+      mm = "Apr "
+    elif m == "05":
+      mm = "May "
+    elif m == "06":
+      mm = "Jun "
+    elif m == "07":
+      mm = "Jul "
+    elif m == "08":
+      mm = "Aug "
+    elif m == "09":
+      mm = "Sep "
+    elif m == "10":
+      mm = "Oct "
+    elif m == "11":
+      mm = "Nov "
+    elif m == "12":
+      mm = "Dec "
+    else:
+      mm = "*** "
+    return (mm + text[:4])
+
+
+#=====================================================================================================
+#
+# function to find the page each link refers to - returns a list with the page title for each
+# link, or None for a link to a section of the same page or to a page which does not exist
+#
+def link_targets(links, page_lookup, counts = None):
+  targets = []
+  for plink in links:
+    if plink[0:1] == "#":
+      targets += [None]
+    else:
+      targets += [find_title(plink, page_lookup)]
+      if counts != None:
+        counts["link_lookups"] += 1
+  return targets
+
+
+#=====================================================================================================
+#
+# function to to check for bad internal links, using the pages found for them by link_targets
+# (see wiki_names.py - links are matched the way MediaWiki matches them)
+#
+# links are the internal page links from the page record (see page_scan.py), targets the
+# pages found for them, and log messages are added to the log list
+# 
+def check_links(links, targets, pagetitle, log):
+   bad_links = []
+   if pagetitle == "Sitemap":
+     return bad_links
+   for plink, target in zip(links, targets):
+     if plink[0:1] == "#":         # link to a section of the same page
+       i=1
+     elif target == None:
+       bad_links += [plink + "|" + pagetitle]
+       log += ["bad link " + plink + " in " + pagetitle + "\n"]
+         
+   if bad_links == []:
+     log += [pagetitle + " has no bad links\n"]
+     
+   return bad_links
+
+
+#====================================================================================================
+#
+# Function to generate a list of categories sorted by order in the category_list file
+# (categories not in the category_list file are left out)
+#
+def category_sort(cats, category_rank):
+  c_list = []
+  for cat in cats:
+    if len(cat) == 1:
+      c_list += [(0,cat)]
+    else:
+      cnum = category_rank.rank(cat)      # one lookup - see CategoryRank in wiki_names.py
+      if cnum != None:
+        c_list += [(cnum,cat.replace("_"," "))]
+
+  sort_list = sorted(c_list, key=lambda x: x[0])
+  return [cat[1] for cat in sort_list]
+
+
+#=====================================================================================================
+#
+# function to process one page - see the result dictionary described at the top of this file
+#
+# page is (page_text, checksum, record) as returned by page_cache.cached_pages - the page is
+# only scanned if record is None (not in the page cache, or changed since). targets are the
+# pages found for the links of the record by link_targets, if they have been looked up already
+# (see bench_sitemap.py), otherwise they are looked up here.
+#
+def process_page(page, targets = None):
+  start = time.perf_counter()
+  result = process_record(page, targets)
+  result["seconds"] = time.perf_counter() - start
+  return result
+
+def process_record(page, targets = None):
+  log = []
+  page_text, checksum, record = page
+  counts = {"regex_passes": 0, "link_lookups": 0, "bad_links": 0}
+  if record == None:
+    record = scan_page(page_text, counts)                               # title, categories, links, media files etc.
+  result = {"title": record["title"], "newtitle": "", "files": record["files"], "media": record["media"],
+            "list": "", "entry": None, "retain": False, "bad_links": [], "links": [], "log": "",
+            "checksum": checksum, "record": record, "size": len(page_text) if page_text != None else 0,
+            "counts": counts}
+  if record["title"] == "":
+    result["log"] = "Page without title: suspect error\n"
+    return result
+
+  pagetitle = record["title"]                                           # retrieve page title
+  if record["has_text"]:
+    if targets == None:
+      targets = link_targets(record["links"], page_lookup, counts)      # one lookup per link
+    result["links"] = [target for target in targets if target != None]
+  else:
+    targets = []
+  newpagetitle = reformat(pagetitle)                                    # reformat
+  result["newtitle"] = newpagetitle
+  log += ["Processing page " + pagetitle + "\n"]
+
+  # extract info from page depending on namespace value
+  namespace = record["namespace"]
+  if namespace == "":
+    log += ["No namespace found\n"]
+  timestamp = record["timestamp"]
+  if namespace not in ["3000", "3002", "3004", "3008", "0"]:
+    result["log"] = "".join(log)
+    return result
+
+  # categories, life span and bad links are needed for every page listed in the sitemap
+  categories = []
+  if len(record["categories"]) > 0:
+    categories = category_sort(record["categories"], category_rank)
+  life_span = record["lifespan"]
+  bad_link_list = []
+  if record["has_text"]:
+    bad_link_list = check_links(record["links"], targets, pagetitle, log)
+    counts["bad_links"] = len(bad_link_list)
+  else:
+    log += ["No text opening found:" + page_text[0:800] + "\n\n"]
+
+  retain_page = False
+  if namespace == "3000" or namespace == "3002":     # person pages
+    if re.search('Person:', newpagetitle) or re.search('Profile:', newpagetitle):
+      retain_page = True
+    else:
+      log += ["No Person: or Profile: text found\n"]
+    result["list"] = "ppages"
+    page_entry = PageEntry(namespace, newpagetitle, pagetitle, categories, timestamp_mon_year(timestamp), life_span)
+    names = newpagetitle.split(":")                  # sorted on the name following Person: or Profile:
+    page_entry.sort_key = names[min(1, len(names) - 1)].strip(" ") + "|" + page_entry.sort_key
+
+  elif namespace == "3008":                          # organisation pages
+    if re.search('Organisation:', pagetitle):
+      retain_page = True
+    else:
+      log += ["No Organisation: text found\n"]
+    result["list"] = "opages"
+    page_entry = PageEntry(namespace, newpagetitle, pagetitle, categories, timestamp_mon_year(timestamp), life_span)
+
+  elif namespace == "3004":                          # place pages
+    if re.search('Place:', pagetitle):
+      retain_page = True
+    else:
+      log += ["No Place: text found\n"]
+    result["list"] = "plpages"
+    page_entry = PageEntry(namespace, newpagetitle, pagetitle, categories, timestamp_mon_year(timestamp), "")
+
+  else:                                              # main (top level) pages
+    retain_page = not record["redirect"]
+    for excluded in excluded_titles:
+      if excluded in pagetitle:
+        retain_page = False
+    if retain_page:
+      result["list"] = "mpages"
+    result["bad_links"] = bad_link_list              # broken links are only reported for main pages
+    page_entry = PageEntry(namespace, newpagetitle, pagetitle, categories, timestamp_mon_year(timestamp), "")
+
+  log += [page_entry.text() + "\n"]
+  result["entry"] = page_entry
+  result["retain"] = retain_page
+  result["log"] = "".join(log)
+  return result
@@ -0,0 +1,104 @@
+'''  sitemap_publish.py
+
+ Saving the sitemap on the wiki with pywikibot, changed pages only
+
+ publish_pages takes the sitemap pages to be saved (page name => wikitext: the whole sitemap as
+ one page, or the index page and subpages from sitemap_render.render_subpages), reads the live
+ text of all of them from the wiki in batches, and saves only the pages whose text has changed.
+ Pages are compared by a hash of each section (split at the == headings), so the log and the
+ edit summary say which sections changed, and an unchanged page costs no edit at all.
+
+ The wiki is reached in the same way as in crosslink.py: pywikibot.Site with the user-config.py
+ file in the working directory, and Page.put to save a page. pywikibot is only needed when the
+ sitemap is published.
+
+'''
+import re
+import hashlib
+
+heading_pattern = re.compile(r'^(=+)[^=\n].*?\1[ \t]*$', re.M)    # == heading == line
+preload_group_size = 50        # pages read from the wiki in one request
+
+
+#=====================================================================================================
+#
+# function to return the hash of some wikitext - MediaWiki removes white space from the end of the
+# text when a page is saved, so it is ignored here too
+#
+def text_hash(text):
+  return hashlib.sha1(text.rstrip().encode('utf-8')).hexdigest()
+
+
+#=====================================================================================================
+#
+# function to split wikitext into sections - returns a list of (heading, hash), the text before
+# the first heading having the heading ""
+#
+def section_hashes(text):
+  sections = []
+  heading = ""
+  start = 0
+  for match in heading_pattern.finditer(text):
+    sections += [(heading, text_hash(text[start:match.start()]))]
+    heading = match.group(0).strip(" \t=")
+    start = match.start()
+  sections += [(heading, text_hash(text[start:]))]
+  return sections
+
+
+#=====================================================================================================
+#
+# function to return the headings of the sections which differ between two versions of a page
+# (including sections added or removed)
+#
+def changed_sections(old_text, new_text):
+  old_sections = section_hashes(old_text)
+  new_sections = section_hashes(new_text)
+  changed = []
+  for heading, digest in new_sections:
+    if (heading, digest) not in old_sections:
+      changed += [heading if heading != "" else "(top)"]
+  new_headings = [heading for heading, digest in new_sections]
+  for heading, digest in old_sections:
+    if heading not in new_headings:
+      changed += [heading if heading != "" else "(top)"]
+  return changed
+
+
+#=====================================================================================================
+#
+# function to save the pages which differ from the live wiki pages
+#
+# pages is a dictionary: page name => wikitext. Returns a dictionary of counts: pages, changed,
+# unchanged, failed and sections (sections changed in all pages). Messages are added to log.
+#
+def publish_pages(pages, summary, log, site_code = 'en'):
+  import pywikibot
+
+  site = pywikibot.Site(site_code)
+  wiki_pages = [pywikibot.Page(site, page_name) for page_name in pages]
+  for page in site.preloadpages(wiki_pages, groupsize = preload_group_size):   # live text, in batches
+    pass
+
+  changes = []
+  for page, (page_name, text) in zip(wiki_pages, pages.items()):
+    live_text = page.text if page.exists() else ""
+    if text_hash(live_text) != text_hash(text):
+      changes += [(page, page_name, text, changed_sections(live_text, text))]
+    else:
+      log += ["publish: unchanged " + page_name + "\n"]
+
+  counts = {"pages": len(pages), "changed": len(changes), "unchanged": len(pages) - len(changes), "failed": 0,
+            "sections": sum([len(sections) for page, page_name, text, sections in changes])}
+  for page, page_name, text, sections in changes:
+    summary_text = (summary + ": " + str(counts["changed"]) + " of " + str(counts["pages"]) + " pages changed, " +
+                    str(len(sections)) + " sections changed in this page (" + ", ".join(sections) + ")")
+    if len(summary_text) > 250:                 # MediaWiki shortens longer summaries
+      summary_text = summary_text[:246] + "...)"
+    try:
+      page.put(text, summary = summary_text, force = True)
+      log += ["publish: saved " + page_name + " - " + ", ".join(sections) + "\n"]
+    except pywikibot.exceptions.Error as error:
+      counts["failed"] += 1
+      log += ["publish: failed to save " + page_name + " - " + str(error) + "\n"]
+  return counts
@@ -0,0 +1,281 @@
+'''  sitemap_render.py
+
+ Rendering of the sitemap wiki table, spreadsheet (tab separated) file and pages file
+
+ render_sitemap takes the sorted lists of sitemap entries (PageEntry objects - see
+ sitemap_pages.py) from sitemap.py and returns the text of each output file. The entries are
+ put into buckets in a single pass - top level pages by state, and biographies and places by
+ the first letter of the name - before any text is produced. Each output is built as a list of
+ strings and joined once, rather than written to the file a piece at a time.
+
+ Result dictionary returned by render_sitemap:
+   wiki    wiki table text (wiki-table file)
+   csv     spreadsheet text
+   pages   pages list text
+   log     "page:" lines for the log file
+
+ render_subpages renders the same tables split into a short index page and a subpage for each
+ state, letter or section (e.g. "Sitemap/Biographies/A"), each starting with links to the index
+ page and to the other subpages of its section. It returns a dictionary: page name => text.
+
+'''
+from wiki_names import url_title, percent_decode
+
+# top level pages are listed under each state found in their categories, or under National if none is
+states = ['National','Australian Capital Territory','New South Wales','Northern Territory','Queensland','South Australia','Victoria','Tasmania','Western Australia']
+
+# namespace prefixes removed from page names for display
+name_prefixes = ["Person:", "Profile:", "Place:", "Organisation:"]
+
+person_tabs = True          # biographies in a tab for each letter (otherwise one table)
+organisation_tabs = False   # organisations in a tab for each letter (currently not enough for tabs)
+place_tabs = True           # places in a tab for each letter
+
+# table headers for each section
+state_header = ("{| class = wikitable style=color:blue; background-color:##ffcfcf; callpadding=5; width=100% \n"
+                "\n! page !! categories !! timestamp \n")
+person_header = ("{| class = wikitable style=color:black; background-color:##cfcfcf; callpadding=5; width=100% \n"
+                 "\n! name !! life-span !! categories !! timestamp \n")
+organisation_header = ("{| class = wikitable style=color:blue; background-color:##ffcfcf; callpadding=5; width=100% \n"
+                       "\n! oganisation !! lifespan !! categories !! timestamp \n")
+place_header = ("{| class = wikitable style=color:green; background-color:##cfffcf; callpadding=5; width=100% \n"
+                "\n! place !! categories !! timestamp \n")
+
+
+#=====================================================================================================
+#
+# function to remove namespace prefixes (Person: etc.) from a page name for display
+#
+def display_name(name):
+  for prefix in name_prefixes:
+    name = name.replace(prefix, "")
+  return name
+
+
+#=====================================================================================================
+#
+# function to put top level page entries into a bucket for each state (one pass over the pages)
+#
+def state_buckets(pages):
+  buckets = {}
+  for state in states:
+    buckets[state] = []
+  for entry in pages:
+    found = False
+    for state in states:
+      for cat in entry.categories:
+        if state in cat:
+          buckets[state] += [entry]
+          found = True
+          break
+    if not found:
+      buckets['National'] += [entry]
+  return buckets
+
+
+#=====================================================================================================
+#
+# function to put entries into a bucket for each first letter of the display name, in order
+#
+def letter_buckets(pages):
+  buckets = {}
+  for entry in pages:
+    text = display_name(entry.name)
+    letter = text[:1]
+    if letter not in buckets:
+      buckets[letter] = []
+    buckets[letter] += [(entry, text)]
+  return buckets
+
+
+#=====================================================================================================
+#
+# function to return the page URL link for a wiki table row
+#
+def page_link(site_URL, pagetitle, text):
+  return "|-\n| [" + site_URL + url_title(pagetitle) + " " + text + " ] ||"
+
+
+#=====================================================================================================
+#
+# functions to render each section of the sitemap - text is added to the wiki, csv and log lists
+#
+# Biographies, organisations and places are rendered by render_lettered, with a row function
+# for the table rows of each section.
+#
+def state_row(entry, site_URL, wiki, csv, log):
+  cat = entry.category_text()
+  wiki += [page_link(site_URL, entry.title, entry.name) + " " + cat + "||" + entry.timestamp + "\n"]
+  csv += [entry.title + "\t" + entry.name + "\t" + cat + "\t" + entry.timestamp + "\n"]
+  log += ["page:" + entry.text() + "|" + entry.name + "|" + entry.title + "|" + cat + "|" + entry.timestamp + "\n"]
+
+def render_states(pages, site_URL, wiki, csv, log):
+  wiki += ["\n\n\n==Top Level Pages by State==\n\n"]
+  csv += ["\n\n==Top Level Pages by State=\n\n"]
+  wiki += ["<tabs>\n"]
+  for state, bucket in state_buckets(pages).items():
+    wiki += ["<tab name=\"" + state + "\">\n", state_header]
+    csv += ["\n\n" + state + "\t categories \t timestamp \t\n\n"]
+    for entry in bucket:
+      state_row(entry, site_URL, wiki, csv, log)
+    wiki += ["|}\n\n", "</tab>\n"]
+  wiki += ["</tabs>\n"]
+
+def render_lettered(pages, tabs, header, row, site_URL, wiki, csv, log):
+  buckets = letter_buckets(pages)
+  if tabs:
+    wiki += ["<tabs>\n"]
+  else:
+    wiki += ["\n", header]
+  for letter, bucket in buckets.items():
+    if tabs:
+      wiki += ["<tab name=\"" + letter + "\">\n", header]
+    for entry, text in bucket:
+      row(entry, text, site_URL, wiki, csv, log)
+    if tabs:
+      wiki += ["|}\n\n", "</tab>\n"]
+  if tabs:
+    wiki += ["</tabs>\n"]
+  else:
+    wiki += ["|}\n\n"]
+
+def life_span(ls):
+  if len(ls) > 3:
+    return " (" + ls + ")"
+  return ls
+
+def person_row(entry, text, site_URL, wiki, csv, log):
+  cat = entry.category_text()
+  ls = life_span(entry.lifespan)
+  log += ["page:" + entry.text() + "|==|" + text + "|" + entry.title + "|" + cat + "|" + entry.timestamp + "\n"]
+  wiki += [page_link(site_URL, entry.title, text) + " " + ls + " || " + cat + "||" + entry.timestamp + "\n"]
+  csv += [entry.title + "\t" + text + " " + ls + "\t" + cat + "\t" + entry.timestamp + "\n"]
+
+def organisation_row(entry, text, site_URL, wiki, csv, log):
+  cat = entry.category_text()
+  ls = life_span(entry.lifespan)
+  log += ["page:" + entry.text() + "|==|" + text + "|" + entry.title + "|" + cat + "|" + entry.timestamp + "\n"]
+  wiki += [page_link(site_URL, entry.title, text) + ls + " || " + cat + "||" + entry.timestamp + "\n"]
+  csv += [entry.title + "\t" + text + " " + ls + "\t" + cat + "\t" + entry.timestamp + "\n"]
+
+def place_row(entry, text, site_URL, wiki, csv, log):
+  cat = entry.category_text()
+  log += ["page:" + entry.text() + "|" + text + "|" + entry.title + "|" + cat + "|" + entry.timestamp + "\n"]
+  wiki += [page_link(site_URL, entry.title, text) + " " + cat + "||" + entry.timestamp + "\n"]
+  csv += [entry.title + "\t" + text + "\t" + cat + "\t" + entry.timestamp + "\n"]
+
+def render_people(pages, site_URL, wiki, csv, log):
+  wiki += ["==Biographies==\n\n"]
+  csv += ["==Biographies==\n\n"]
+  render_lettered(pages, person_tabs, person_header, person_row, site_URL, wiki, csv, log)
+
+def render_organisations(pages, site_URL, wiki, csv, log):
+  wiki += ["\n\n\n==Organisations==\n\n"]
+  csv += ["\n\n==Organisations==\n\n"]
+  render_lettered(pages, organisation_tabs, organisation_header, organisation_row, site_URL, wiki, csv, log)
+
+def render_places(pages, site_URL, wiki, csv, log):
+  wiki += ["\n\n\n==Places==\n\n"]
+  csv += ["\n\n==Places==\n\n"]
+  render_lettered(pages, place_tabs, place_header, place_row, site_URL, wiki, csv, log)
+
+def render_bad_links(bad_links, wiki, csv):
+  if len(bad_links) > 0:
+    wiki += ["\n\n\n==Possible broken links==\n\n"]
+    csv += ["\n\n==Possible broken links=\n\n"]
+    for link in bad_links:
+      bar_p = link.find("|")
+      plink = percent_decode(link[:bar_p])
+      pagetitle = percent_decode(link[bar_p + 1:])
+      wiki += ["[[" + plink + "]] in page [[" + pagetitle + "]]<br>\n"]
+      csv += [plink + "\t" + pagetitle + "\n"]
+
+
+#=====================================================================================================
+#
+# function to render the whole sitemap - see the result dictionary described at the top of this file
+#
+# mpages, ppages, opages and plpages are the sorted top level, biography, organisation and place
+# entries, and bad_links the "link|title" bad links
+#
+def render_sitemap(xml_data_file, site_URL, mpages, ppages, opages, plpages, bad_links):
+  wiki = []
+  csv = []
+  log = []
+  pages = []
+  for page_list in [mpages, ppages, opages, plpages]:
+    for entry in page_list:
+      pages += [entry.text() + "\n"]
+
+  wiki += ["==Sitemap from " + xml_data_file + "==\n\n"]
+  wiki += ["| [[#Biographies|Biographies]] | [[#Organisations|List of Organisations]]  |  [[#Places|List of Places]] |\n\n"]
+  render_states(mpages, site_URL, wiki, csv, log)
+  render_people(ppages, site_URL, wiki, csv, log)
+  render_organisations(opages, site_URL, wiki, csv, log)
+  render_places(plpages, site_URL, wiki, csv, log)
+  render_bad_links(bad_links, wiki, csv)
+
+  return {"wiki": "".join(wiki), "csv": "".join(csv), "pages": "".join(pages), "log": "".join(log)}
+
+
+#=====================================================================================================
+#
+# functions to render the sitemap as an index page and subpages (see the top of this file)
+#
+# Subpage names use the first letter of the names in the subpage (upper case) if it is a letter
+# or digit, otherwise "Other" (some characters are not allowed in page names).
+#
+def subpage_letter(letter):
+  if letter.isalnum():
+    return letter.upper()
+  return "Other"
+
+def add_section(index_name, section, groups, subpages, index):
+  links = []
+  for key in groups:
+    name = index_name + "/" + section
+    if key != "":
+      name += "/" + key
+    links += ["[[" + name + "|" + (key if key != "" else section) + "]]"]
+  navigation = "[[" + index_name + "|" + index_name + "]] - " + section + ": " + " | ".join(links) + "\n\n"
+  for key, (header, rows) in groups.items():
+    name = index_name + "/" + section
+    if key != "":
+      name += "/" + key
+    subpages[name] = navigation + header + "".join(rows) + "|}\n"
+  index += ["\n==" + section + "==\n\n" + " | ".join(links) + "\n"]
+
+def lettered_groups(pages, tabs, header, row, site_URL):
+  groups = {}
+  for letter, bucket in letter_buckets(pages).items():
+    key = subpage_letter(letter) if tabs else ""
+    if key not in groups:
+      groups[key] = (header, [])
+    for entry, text in bucket:
+      row(entry, text, site_URL, groups[key][1], [], [])
+  return groups
+
+def render_subpages(xml_data_file, site_URL, mpages, ppages, opages, plpages, bad_links, index_name = "Sitemap"):
+  subpages = {}
+  index = ["==Sitemap from " + xml_data_file + "==\n"]
+  subpages[index_name] = ""              # index page first - text added at the end
+
+  groups = {}
+  for state, bucket in state_buckets(mpages).items():
+    rows = []
+    for entry in bucket:
+      state_row(entry, site_URL, rows, [], [])
+    groups[state] = (state_header, rows)
+  add_section(index_name, "Top Level Pages by State", groups, subpages, index)
+  add_section(index_name, "Biographies", lettered_groups(ppages, person_tabs, person_header, person_row, site_URL), subpages, index)
+  add_section(index_name, "Organisations", lettered_groups(opages, organisation_tabs, organisation_header, organisation_row, site_URL), subpages, index)
+  add_section(index_name, "Places", lettered_groups(plpages, place_tabs, place_header, place_row, site_URL), subpages, index)
+
+  if len(bad_links) > 0:
+    wiki = []
+    render_bad_links(bad_links, wiki, [])
+    subpages[index_name + "/Possible broken links"] = "[[" + index_name + "|" + index_name + "]]\n" + "".join(wiki)
+    index += ["\n[[" + index_name + "/Possible broken links|Possible broken links]]\n"]
+
+  subpages[index_name] = "".join(index)
+  return subpages
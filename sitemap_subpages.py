@@ -0,0 +1,68 @@
+'''  sitemap_subpages.py
+
+ Saving the sitemap index page and subpages (see sitemap_render.render_subpages)
+
+ Each page is saved as a text file in the subpages folder, named after the page with "/"
+ replaced by " - " (e.g. "Sitemap - Biographies - A.txt"). A manifest file in the folder
+ records a hash of the text of each page, so that only pages whose text has changed since the
+ last run are written. The names of the pages which changed are listed in changed_file_name,
+ so that only those pages need to be saved on the wiki. Files of pages which are no longer
+ part of the sitemap (e.g. a letter with no pages left) are deleted.
+
+ Manifest file (JSON): {"version": manifest_version, "pages": {page name: [file name, sha1 of the text]}}
+
+ A manifest which is missing, damaged or of another version (see json_files.py) is treated as
+ empty, so every page is written.
+
+'''
+import os
+import hashlib
+from json_files import load_versioned_json, save_json_atomic, atomic_open
+
+manifest_file_name = "subpages.json"
+manifest_version = "1"
+changed_file_name = "changed_subpages.txt"
+
+
+#=====================================================================================================
+#
+# function to return the file name of a page
+#
+def subpage_file_name(page_name):
+  return page_name.replace("/", " - ") + ".txt"
+
+
+#=====================================================================================================
+#
+# function to save the pages which have changed - returns (changed page names, removed page names)
+#
+def save_subpages(folder, subpages):
+  os.makedirs(folder, exist_ok = True)
+  manifest = {}
+  saved = load_versioned_json(os.path.join(folder, manifest_file_name), manifest_version)
+  if saved != None:                         # no manifest, damaged or older version - write every page
+    manifest = saved["pages"]
+
+  new_manifest = {}
+  changed = []
+  for page_name, text in subpages.items():
+    file_name = subpage_file_name(page_name)
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    new_manifest[page_name] = [file_name, digest]
+    if manifest.get(page_name) != [file_name, digest] or not os.path.exists(os.path.join(folder, file_name)):
+      with open(os.path.join(folder, file_name), 'w', encoding="utf-8") as page_file:
+        page_file.write(text)
+      changed += [page_name]
+
+  removed = []
+  for page_name, (file_name, digest) in manifest.items():
+    if page_name not in new_manifest:
+      if os.path.exists(os.path.join(folder, file_name)):
+        os.remove(os.path.join(folder, file_name))
+      removed += [page_name]
+
+  save_json_atomic(os.path.join(folder, manifest_file_name), {"version": manifest_version, "pages": new_manifest})
+  with atomic_open(os.path.join(folder, changed_file_name)) as changed_file:
+    for page_name in changed:
+      changed_file.write(page_name + "\n")
+  return (changed, removed)
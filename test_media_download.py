@@ -0,0 +1,240 @@
+'''  test_media_download.py
+
+ Tests of the media downloader (media_download.py) against a local media server
+
+ The server (http.server, in a thread) serves the files in its files dictionary, with an ETag
+ (the MD5 hash of the content), Content-Length, conditional requests (If-None-Match), ranges
+ (Range / If-Range) and 404 for unknown files. Files named in its short set are sent with only
+ half of their content, as if the connection had been lost. The headers of each request are
+ kept in its requests list.
+
+ Run with:  python -m unittest test_media_download   (or python -m pytest)
+
+'''
+import os
+import hashlib
+import tempfile
+import threading
+import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from media_download import MediaDownloader, manifest_file_name
+from media_store import MediaStore
+from media_audit import file_hash
+
+
+#=====================================================================================================
+#
+# MediaHandler class - request handler of the local media server
+#
+class MediaHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def do_HEAD(self):
+    self.__reply(False)
+
+  def do_GET(self):
+    self.__reply(True)
+
+  def log_message(self, format, *args):       # no messages on the console
+    return
+
+  def __reply(self, send_body):
+    name = self.path.lstrip("/")
+    self.server.requests += [(self.command, name, dict(self.headers))]
+    content = self.server.files.get(name)
+    if content == None:
+      self.send_response(404)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+
+    etag = '"' + hashlib.md5(content).hexdigest() + '"'
+    if self.headers.get("If-None-Match") == etag:
+      self.send_response(304)
+      self.send_header("ETag", etag)
+      self.end_headers()
+      return
+
+    offset = 0
+    range_header = self.headers.get("Range", "")
+    if range_header.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+      offset = int(range_header[6:].split("-")[0])
+    if offset > 0:
+      self.send_response(206)
+      self.send_header("Content-Range", "bytes " + str(offset) + "-" + str(len(content) - 1) + "/" + str(len(content)))
+    else:
+      self.send_response(200)
+    self.send_header("ETag", etag)
+    self.send_header("Content-Length", str(len(content) - offset))
+    self.end_headers()
+    if send_body:
+      body = content[offset:]
+      if name in self.server.short:
+        body = body[:len(body) // 2]            # connection lost part way through the file
+        self.close_connection = True
+      self.wfile.write(body)
+
+
+#=====================================================================================================
+#
+# MediaDownloadTest class
+#
+class MediaDownloadTest(unittest.TestCase):
+  def setUp(self):
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+    self.server.files = {"A_b.jpg": os.urandom(200000), "Doc.pdf": b"%PDF" + os.urandom(5000)}
+    self.server.short = set()
+    self.server.requests = []
+    self.server_thread = threading.Thread(target = self.server.serve_forever)
+    self.server_thread.start()
+    self.base_url = "http://127.0.0.1:" + str(self.server.server_address[1]) + "/"
+    self.folder = tempfile.TemporaryDirectory()
+    self.download_path = self.folder.name + "/"
+    self.session = requests.Session()
+
+  def tearDown(self):
+    self.session.close()
+    self.server.shutdown()
+    self.server.server_close()
+    self.server_thread.join()
+    self.folder.cleanup()
+
+  # download the files in names with a new downloader, as one run of sitemap.py would
+  def download(self, names, download_path = None, store = None, site = ""):
+    if download_path == None:
+      download_path = self.download_path
+    downloader = MediaDownloader(self.base_url, download_path, self.session, workers = 2, store = store, site = site)
+    for name in names:
+      downloader.add(name, "Test page")
+    return downloader.finish()
+
+  def read(self, name):
+    with open(self.download_path + name, 'rb') as media_file:
+      return media_file.read()
+
+  def test_downloaded(self):
+    summary = self.download(["A_b.jpg", "Doc.pdf"])
+    self.assertEqual(summary["downloaded"], 2)
+    self.assertEqual(summary["failed"], 0)
+    self.assertEqual(summary["bytes"], len(self.server.files["A_b.jpg"]) + len(self.server.files["Doc.pdf"]))
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+    self.assertEqual(self.read("Doc.pdf"), self.server.files["Doc.pdf"])
+    self.assertTrue(os.path.exists(self.download_path + manifest_file_name))
+
+  def test_not_found(self):
+    summary = self.download(["Missing.jpg"])
+    self.assertEqual(summary["failed"], 1)
+    self.assertEqual(summary["failures"][0][0], "Missing.jpg")
+    self.assertEqual(summary["failures"][0][3], "status 404")
+    self.assertFalse(os.path.exists(self.download_path + "Missing.jpg"))
+    self.assertFalse(os.path.exists(self.download_path + "Missing.jpg.part"))
+
+  def test_part_renamed(self):
+    # an interrupted download stays in the .part file - nothing appears under the real name
+    self.server.short.add("A_b.jpg")
+    summary = self.download(["A_b.jpg"])
+    self.assertEqual(summary["failed"], 1)
+    self.assertFalse(os.path.exists(self.download_path + "A_b.jpg"))
+    self.assertTrue(os.path.exists(self.download_path + "A_b.jpg.part"))
+
+    # a complete download is renamed from the .part file to the real name
+    self.server.short.clear()
+    self.download(["A_b.jpg"])
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+    self.assertFalse(os.path.exists(self.download_path + "A_b.jpg.part"))
+
+  def test_unchanged(self):
+    self.download(["A_b.jpg"])
+    summary = self.download(["A_b.jpg"])
+    self.assertEqual(summary["unchanged"], 1)
+    self.assertEqual(summary["bytes"], 0)
+    method, name, headers = self.server.requests[-1]
+    self.assertEqual(headers.get("If-None-Match"), '"' + hashlib.md5(self.server.files["A_b.jpg"]).hexdigest() + '"')
+
+  def test_resumed(self):
+    self.server.short.add("A_b.jpg")
+    self.download(["A_b.jpg"])
+    part_size = os.path.getsize(self.download_path + "A_b.jpg.part")
+    self.server.short.clear()
+    summary = self.download(["A_b.jpg"])
+    self.assertEqual(summary["resumed"], 1)
+    self.assertEqual(summary["bytes"], len(self.server.files["A_b.jpg"]) - part_size)
+    method, name, headers = self.server.requests[-1]
+    self.assertEqual(headers.get("Range"), "bytes=" + str(part_size) + "-")
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+
+  def test_truncated(self):
+    # a local file shorter than the size in the manifest is completed with a range request
+    self.download(["A_b.jpg"])
+    with open(self.download_path + "A_b.jpg", 'r+b') as media_file:
+      media_file.truncate(50000)
+    summary = self.download(["A_b.jpg"])
+    self.assertEqual(summary["resumed"], 1)
+    self.assertEqual(summary["bytes"], len(self.server.files["A_b.jpg"]) - 50000)
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+    self.assertFalse(os.path.exists(self.download_path + "A_b.jpg.part"))
+
+  def test_linked_from_store(self):
+    # the same content under another name, on another site, is linked from the store
+    self.server.files["Copy_of_A_b.jpg"] = self.server.files["A_b.jpg"]
+    store = MediaStore(self.download_path + "store/")
+    os.makedirs(self.download_path + "site1/")
+    os.makedirs(self.download_path + "site2/")
+    self.download(["A_b.jpg"], self.download_path + "site1/", store, "site1")
+    summary = self.download(["Copy_of_A_b.jpg"], self.download_path + "site2/", store, "site2")
+    self.assertEqual(summary["linked"], 1)
+    self.assertEqual(summary["bytes"], 0)
+    self.assertEqual([(method, name) for method, name, headers in self.server.requests if name == "Copy_of_A_b.jpg"],
+                     [("HEAD", "Copy_of_A_b.jpg")])
+    self.assertEqual(self.read("site2/Copy_of_A_b.jpg"), self.server.files["A_b.jpg"])
+    digest = store.lookup("site2", "Copy_of_A_b.jpg")
+    self.assertEqual(digest, store.lookup("site1", "A_b.jpg"))
+    self.assertTrue(os.path.samefile(store.blob_path(digest), self.download_path + "site2/Copy_of_A_b.jpg"))
+    self.assertEqual(store.counts()["blobs"], 1)
+    store.close()
+
+  def test_store_blob_changed(self):
+    # a file changed on the server is written to a new file - the blob it was linked to is unchanged
+    store = MediaStore(self.download_path + "store/")
+    self.download(["A_b.jpg"], store = store, site = "site1")
+    old_digest = store.lookup("site1", "A_b.jpg")
+    self.server.files["A_b.jpg"] = os.urandom(120000)
+    summary = self.download(["A_b.jpg"], store = store, site = "site1")
+    self.assertEqual(summary["downloaded"], 1)
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+    digest = store.lookup("site1", "A_b.jpg")
+    self.assertNotEqual(digest, old_digest)
+    self.assertEqual(file_hash(store.blob_path(digest)), digest)
+    self.assertEqual(file_hash(store.blob_path(old_digest)), old_digest)
+    store.close()
+
+  def test_store_blob_truncated(self):
+    # a truncated linked file is copied before the rest is fetched, so the new content does not
+    # go into the blob - the truncated blob is no longer matched
+    self.server.files["Copy_of_A_b.jpg"] = self.server.files["A_b.jpg"]
+    old_etag = hashlib.md5(self.server.files["A_b.jpg"]).hexdigest()
+    store = MediaStore(self.download_path + "store/")
+    self.download(["A_b.jpg"], store = store, site = "site1")
+    old_digest = store.lookup("site1", "A_b.jpg")
+    with open(self.download_path + "A_b.jpg", 'r+b') as media_file:
+      media_file.truncate(50000)
+    self.server.files["A_b.jpg"] = os.urandom(120000)
+    summary = self.download(["A_b.jpg"], store = store, site = "site1")
+    self.assertEqual(summary["failed"], 0)
+    self.assertEqual(self.read("A_b.jpg"), self.server.files["A_b.jpg"])
+    digest = store.lookup("site1", "A_b.jpg")
+    self.assertEqual(file_hash(store.blob_path(digest)), digest)
+    self.assertEqual(os.path.getsize(store.blob_path(old_digest)), 50000)
+    self.assertEqual(store.find(old_etag), None)
+
+    # the same content again replaces the damaged blob
+    os.makedirs(self.download_path + "site2/")
+    summary = self.download(["Copy_of_A_b.jpg"], self.download_path + "site2/", store, "site2")
+    self.assertEqual(summary["downloaded"], 1)
+    self.assertEqual(file_hash(store.blob_path(old_digest)), old_digest)
+    store.close()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,74 @@
+'''  test_page_scan.py
+
+ Tests of the page scanner (page_scan.py) on pages in the form read from an XML backup (wiki
+ text XML escaped, as in the <text> element)
+
+ Run with:  python -m unittest test_page_scan   (or python -m pytest)
+
+'''
+import unittest
+from xml.sax.saxutils import escape
+from page_scan import scan_page
+
+
+#=====================================================================================================
+#
+# function to make the text of a page (between <page> and </page>) with the given wiki text
+#
+def page_text(wikitext, title = "Test page", namespace = "0"):
+  return ("<title>" + escape(title) + "</title><ns>" + namespace + "</ns><revision><timestamp>2024-05-01T10:00:00Z</timestamp>"
+          "<text bytes=\"" + str(len(wikitext)) + "\" xml:space=\"preserve\">" + escape(wikitext, {'"': "&quot;"}) + "</text></revision>")
+
+
+#=====================================================================================================
+#
+# PageScanTest class
+#
+class PageScanTest(unittest.TestCase):
+  def test_record(self):
+    record = scan_page(page_text("'''John Smith''' (1850 - 1920) built [[Brown Bridge|a bridge]] and [[Water_supply]].\n"
+                                 "[[File:A b.jpg|thumb|caption]] [[Media:Report.pdf|report]]\n"
+                                 "<gallery>\nFile:Gallery1.jpg|caption\n</gallery>\n[[Category:Engineers]]",
+                                 "Person:John Smith", "3000"))
+    self.assertEqual(record["title"], "Person:John Smith")
+    self.assertEqual(record["namespace"], "3000")
+    self.assertEqual(record["timestamp"], "2024-05-01T10:00:00Z")
+    self.assertTrue(record["has_text"])
+    self.assertFalse(record["redirect"])
+    self.assertEqual(record["links"], ["Brown Bridge", "Water supply"])
+    self.assertEqual(record["files"], ["A b.jpg", "Gallery1.jpg"])
+    self.assertEqual(record["media"], ["Report.pdf"])
+    self.assertEqual(record["categories"], ["Engineers"])
+    self.assertEqual(record["lifespan"], "1850-1920")
+
+  def test_sections_skipped(self):
+    record = scan_page(page_text("<pre>[[Category:Hidden]] [[File:Hidden.jpg|x]]</pre> [[Bar]] "
+                                 "<nowiki>[[Nope link]]</nowiki> [[Category:Railways]]"))
+    self.assertEqual(record["links"], ["Bar"])
+    self.assertEqual(record["files"], [])
+    self.assertEqual(record["categories"], ["Railways"])
+
+  def test_self_closing_nowiki(self):
+    # <nowiki /> does not open a section - the text after it is scanned
+    record = scan_page(page_text("[[Bar]]<nowiki />s and more\n[[Category:Railways]] [[File:X.jpg|thumb]] "
+                                 "<nowiki>[[x]]</nowiki> [[Baz]]"))
+    self.assertEqual(record["links"], ["Bar", "Baz"])
+    self.assertEqual(record["categories"], ["Railways"])
+    self.assertEqual(record["files"], ["X.jpg"])
+    record = scan_page(page_text("[[Bar]]<nowiki/>s [[Category:Railways]] <nowiki>[[x]]</nowiki>"))
+    self.assertEqual(record["categories"], ["Railways"])
+
+  def test_quoted_attributes(self):
+    # attribute values are escaped as &quot; in the backup - the section is still skipped
+    record = scan_page(page_text('<pre class="wiki" style="color: red">[[Category:Hidden]] [[Nowhere]]</pre> [[Category:Railways]]'))
+    self.assertEqual(record["links"], [])
+    self.assertEqual(record["categories"], ["Railways"])
+
+  def test_redirect(self):
+    record = scan_page(page_text("#REDIRECT [[Brown Bridge]]"))
+    self.assertTrue(record["redirect"])
+    self.assertEqual(record["links"], ["Brown Bridge"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,228 @@
+'''  wiki_dump.py
+
+ Functions for reading an XML file created by a backup (export) of the wiki site
+
+ The XML file is read one <page> element at a time rather than loading the whole file into
+ memory, so that the memory needed depends on the size of the largest page and not on the
+ size of the whole backup. Used by sitemap.py, and available to crosslink.py and other
+ scripts without running the sitemap processing code.
+
+ Each page is returned as the text between <page> and </page> exactly as it appears in the
+ XML file (wiki text is still XML escaped, e.g. &lt;pre&gt;), which is the form the page
+ processing code in sitemap.py expects.
+
+ The XML file may be compressed (file name ending in .gz, .bz2 or .xz, e.g. eha.xml.gz). A
+ compressed file is decompressed as it is read, a block at a time, and is never expanded to
+ disk or into memory as a whole.
+
+ A page index file (the XML file name with ".idx" added) lists the title, namespace, timestamp
+ and byte position of every page. It is built once by scanning a memory map of the XML file,
+ and rebuilt automatically whenever the size or modification time of the XML file changes.
+ With the index, a single page or all pages in one namespace can be read directly from the
+ XML file without scanning the whole file. To find pages by title, build a dictionary of the
+ index entries by title once with title_index, and look up each title with find_page:
+   index = load_page_index(file_name)
+   titles = title_index(index)
+   entry = find_page(titles, title)
+   page_text = read_page(file_name, entry)
+
+ Index entries are tuples:
+   (title, namespace, timestamp, start, end)
+ where start is the byte position of <page> and end the position just after </page>. For a
+ compressed XML file the index is built by reading the file through (a memory map cannot be
+ used), and the positions are in the decompressed XML. Reading pages in index order with
+ iter_index_pages then only decompresses forwards, but read_page has to decompress the file
+ from the start up to the page.
+
+'''
+import os
+import re
+import bz2
+import gzip
+import lzma
+import mmap
+
+read_block_size = 1048576        # number of bytes read from the XML file at a time
+
+# functions to open compressed XML files, by file name extension
+compressed_openers = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+#=====================================================================================================
+#
+# functions to open the XML file for reading as bytes - decompressed as it is read if compressed
+#
+def is_compressed(file_name):
+  return os.path.splitext(file_name)[1].lower() in compressed_openers
+
+def open_dump(file_name):
+  extension = os.path.splitext(file_name)[1].lower()
+  if extension in compressed_openers:
+    return compressed_openers[extension](file_name, 'rb')
+  return open(file_name, 'rb')
+
+
+#=====================================================================================================
+#
+# generator to read the XML file one page at a time
+#
+# Yields the text of each page (between <page> and </page>). Only the current page and the
+# unread part of the current block are held in memory. A page which extends over the end of
+# a block is completed by reading further blocks.
+#
+def iter_pages(file_name):
+  with open_dump(file_name) as file:
+    for st_pt, en_pt, page_bytes in iter_page_bytes(file):
+      yield page_bytes.decode('utf-8')
+
+#
+# generator to read pages from an open file - yields (start, end, page_bytes) for each page,
+# where start is the byte position of <page>, end the position just after </page> and page_bytes
+# the bytes between <page> and </page>
+#
+def iter_page_bytes(file):
+  buffer = b""
+  buffer_pt = 0                                  # position of the start of buffer in the file
+  m_pt = 0                                       # search position in buffer
+  end_of_file = False
+  while True:
+    st_pt = buffer.find(b"<page>", m_pt)           # find next page
+    en_pt = -1
+    if st_pt >= 0:
+      en_pt = buffer.find(b"</page>", st_pt + 6)   # and the end of the page
+    if en_pt >= 0:
+      yield (buffer_pt + st_pt, buffer_pt + en_pt + 7, buffer[st_pt + 6:en_pt])
+      m_pt = en_pt + 7
+    elif end_of_file:
+      return
+    else:
+      # keep the start of an incomplete page (or the last few bytes, which might hold a part
+      # of a <page> tag) and add the next block from the file
+      if st_pt >= 0:
+        keep_pt = st_pt
+      else:
+        keep_pt = max(m_pt, len(buffer) - 5)
+      block = file.read(read_block_size)
+      if not block:
+        end_of_file = True
+      buffer = buffer[keep_pt:] + block
+      buffer_pt += keep_pt
+      m_pt = 0
+
+
+#=====================================================================================================
+#
+# function to build the page index by scanning a memory map of the XML file (or by reading
+# a compressed XML file through)
+#
+def build_page_index(file_name):
+  index = []
+  if os.path.getsize(file_name) == 0:
+    return index
+  if is_compressed(file_name):
+    with open_dump(file_name) as file:
+      for st_pt, en_pt, page_bytes in iter_page_bytes(file):
+        head_end = page_bytes.find(b"<text")
+        if head_end < 0:
+          head_end = len(page_bytes)
+        index += [index_entry(page_bytes[:head_end].decode('utf-8'), st_pt, en_pt)]
+    return index
+  with open(file_name, 'rb') as file:
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as xml_map:
+      m_pt = 0
+      while True:
+        st_pt = xml_map.find(b"<page>", m_pt)
+        if st_pt < 0:
+          break
+        en_pt = xml_map.find(b"</page>", st_pt + 6)
+        if en_pt < 0:
+          break
+        en_pt += 7
+        # title, namespace and timestamp are near the start of the page, ahead of the page text
+        head_end = xml_map.find(b"<text", st_pt, en_pt)
+        if head_end < 0:
+          head_end = en_pt
+        index += [index_entry(xml_map[st_pt:head_end].decode('utf-8'), st_pt, en_pt)]
+        m_pt = en_pt
+  return index
+
+def index_entry(page_head, st_pt, en_pt):
+  title = index_field(r'<title>(.+?)</title>', page_head)
+  namespace = index_field(r'<ns>(.+?)</ns>', page_head)
+  timestamp = index_field(r'<timestamp>(.+?)</timestamp>', page_head)
+  return (title, namespace, timestamp, st_pt, en_pt)
+
+def index_field(pattern, text):
+  field_match = re.search(pattern, text)
+  if field_match:
+    return field_match.group(1)
+  return ""
+
+
+#=====================================================================================================
+#
+# functions to save and load the page index
+#
+# The first line of the index file records the size and modification time of the XML file when
+# the index was built. Each following line is one index entry, separated with tab characters.
+#
+def index_file_name(file_name):
+  return file_name + ".idx"
+
+def index_stamp(file_name):
+  stat = os.stat(file_name)
+  return "#" + str(stat.st_size) + "\t" + str(stat.st_mtime_ns)
+
+def save_page_index(file_name, index):
+  with open(index_file_name(file_name), 'w', encoding="utf-8") as idx_file:
+    idx_file.write(index_stamp(file_name) + "\n")
+    for entry in index:
+      idx_file.write(entry[0] + "\t" + entry[1] + "\t" + entry[2] + "\t" + str(entry[3]) + "\t" + str(entry[4]) + "\n")
+
+def load_page_index(file_name):
+  index = []
+  idx_name = index_file_name(file_name)
+  if os.path.exists(idx_name):
+    with open(idx_name, 'r', encoding="utf-8") as idx_file:
+      lines = idx_file.read().splitlines()
+    if len(lines) > 0 and lines[0] == index_stamp(file_name):      # XML file unchanged since index was built
+      for line in lines[1:]:
+        items = line.split("\t")
+        index += [(items[0], items[1], items[2], int(items[3]), int(items[4]))]
+      return index
+
+  index = build_page_index(file_name)      # no index yet, or XML file has changed
+  save_page_index(file_name, index)
+  return index
+
+
+#=====================================================================================================
+#
+# functions to read pages directly from the XML file using the page index
+#
+# read_page returns the same text as iter_pages (between <page> and </page>). find_page looks up
+# a title in the dictionary returned by title_index (the first entry is kept if a title is in
+# the index more than once), and returns its index entry or None.
+#
+def read_page(file_name, entry):
+  with open_dump(file_name) as file:
+    file.seek(entry[3])
+    page_bytes = file.read(entry[4] - entry[3])
+  return page_bytes[6:-7].decode('utf-8')
+
+def title_index(index):
+  titles = {}
+  for entry in index:
+    titles.setdefault(entry[0], entry)
+  return titles
+
+def find_page(titles, title):
+  return titles.get(title)
+
+def iter_index_pages(file_name, index, namespaces = None):
+  with open_dump(file_name) as file:
+    for entry in index:
+      if namespaces == None or entry[1] in namespaces:
+        file.seek(entry[3])
+        page_bytes = file.read(entry[4] - entry[3])
+        yield page_bytes[6:-7].decode('utf-8')
@@ -0,0 +1,229 @@
+'''  wiki_names.py
+
+ Functions for matching wiki page names
+
+ MediaWiki treats several different spellings of a link as the same page: underscores and
+ spaces are equivalent, repeated spaces count as one, and the first letter of the page name
+ (and of the name following a namespace such as Person:) is always upper case. These functions
+ reduce a page title or link to that normal form, so that links can be checked against the
+ list of pages on the site with a single dictionary lookup.
+
+ The CategoryRank class holds the order of the categories list in the same way, so that the
+ categories of a page can be sorted into categories list order with one lookup each.
+
+ The other name functions used by sitemap.py and crosslink.py are kept here too, so that both
+ scripts treat names the same way: reformat (Person: page titles as "Surname, Forenames"),
+ replace_underscore and media_key (media file names), percent_decode (%xx codes in names),
+ url_title (page title as used in a URL) and straight_apostrophes. The same names occur over
+ and over again in a run (every page linking to a place, every page using an image), so the
+ functions which do more than a simple replace keep the results for recent names
+ (name_cache_size) and their regular expressions are compiled once, when the module is loaded.
+
+'''
+import re
+from functools import lru_cache
+from urllib.parse import unquote
+
+name_cache_size = 65536     # names remembered by each of the name functions
+
+# namespaces used on the site - the name following any of these also starts with a capital letter
+namespace_names = ["Person", "Profile", "Place", "Organisation", "Category", "File", "Media", "Help", "Template", "Special", "User", "MediaWiki"]
+namespace_lookup = {}
+for ns_name in namespace_names:
+  namespace_lookup[ns_name.lower()] = ns_name
+
+
+space_pattern = re.compile(r'\s+')
+whitespace_pattern = re.compile(r'\s')
+trailing_space_pattern = re.compile(r'\s+$')
+bracket_pattern = re.compile(r'\((.*?)\)')
+underscores_pattern = re.compile(r'_+')
+
+
+#=====================================================================================================
+#
+# function to convert the first character of a string to upper case (the rest is unchanged)
+#
+def upper_first(text):
+  return text[:1].upper() + text[1:]
+
+
+#=====================================================================================================
+#
+# function to reduce a page title or internal link target to MediaWiki's normal form
+#
+# "person:smith,_John " => "Person:Smith, John"
+#
+@lru_cache(maxsize = name_cache_size)
+def normalize_title(title):
+  title = title.replace("_", " ")
+  title = space_pattern.sub(' ', title)
+  title = title.strip(" ")
+  title = title.lstrip(":")             # a leading colon links to a page rather than including it
+  colon_p = title.find(":")
+  if colon_p > 0:
+    ns_name = title[:colon_p].rstrip(" ").lower()
+    if ns_name in namespace_lookup:
+      title = namespace_lookup[ns_name] + ":" + upper_first(title[colon_p + 1:].lstrip(" "))
+  return upper_first(title)
+
+
+#=====================================================================================================
+#
+# function to build a lookup table of page titles - the key is the normal form of each title
+# and the value is the title as found in the XML file
+#
+# Built once per run from the page names list, and then used to resolve any link in a single
+# lookup (see find_title).
+#
+def title_lookup(pages_list):
+  lookup = {}
+  for title in pages_list:
+    key = normalize_title(title)
+    if key not in lookup:
+      lookup[key] = title
+  return lookup
+
+
+#=====================================================================================================
+#
+# function to find the page title a link refers to, or None if there is no such page
+#
+# Any #section part of the link is ignored.
+#
+def find_title(link, lookup):
+  hash_p = link.find("#")
+  if hash_p >= 0:
+    link = link[:hash_p]
+  return lookup.get(normalize_title(link))
+
+
+#=====================================================================================================
+#
+# function to reduce a category name to the form used as a CategoryRank key
+#
+# Underscores and spaces are equivalent, and case is ignored.
+#
+def category_key(category):
+  return category.replace("_", " ").casefold()
+
+
+#=====================================================================================================
+#
+# CategoryRank class - position of each category in the categories list
+#
+# Built once per run from the categories list (in sitemap order), then shared by anything that
+# needs to put categories in that order.
+#
+# rank(category)  - position of the category in the categories list, or None if it is not listed
+#
+class CategoryRank:
+  def __init__(self, categories):
+    self.__rank = {}        # category_key => position in the categories list
+    for position, category in enumerate(categories):
+      key = category_key(category)
+      if key not in self.__rank:
+        self.__rank[key] = position
+
+  def __len__(self):
+    return len(self.__rank)
+
+  def rank(self, category):
+    return self.__rank.get(category_key(category))
+
+
+#=====================================================================================================
+#
+# function to reformat page name as Person:<surname>, <forenames>
+#
+# this function was originally introduced to standardize the name format of the WA site pages
+# that were arranged initially as <forename> <familyname> format. Profile: pages are treated in
+# the same way. Any other page name is returned unchanged.
+#
+# "Person:John_Henry_Smith_(1850-1920)" => "Person:Smith, John Henry (1850-1920)"
+#
+@lru_cache(maxsize = name_cache_size)
+def reformat(page_name):
+  prefix = "Person:"
+  name_p = page_name.find(prefix)             # check for "Person:" or "Profile:"
+  if name_p < 0:
+    prefix = "Profile:"
+    name_p = page_name.find(prefix)
+  if name_p < 0:                              # not a person page - don't do anything
+    return page_name
+
+  page_name = page_name[name_p + len(prefix):]
+  bracket_text = bracket_pattern.findall(page_name)    # text in brackets, e.g. dates
+  page_name = bracket_pattern.sub('', page_name)
+  page_name = page_name.replace("_", " ")
+  page_name = page_name.rstrip("\n")
+  page_name = page_name.strip(" ")
+  if "," in page_name:                        # comma found - name already in the right format
+    return prefix + page_name
+
+  names = whitespace_pattern.split(page_name)   # the last name is the family name
+  forenames = ""
+  for name in names[:-1]:
+    forenames += ' ' + name
+  page_name = prefix + names[-1] + ',' + forenames
+  if bracket_text:
+    page_name += ' (' + ', '.join(bracket_text) + ')'   # replace bracket string at end
+  return page_name
+
+
+#=====================================================================================================
+#
+# function to decode %xx codes in a name (urllib.parse.unquote)
+#
+@lru_cache(maxsize = name_cache_size)
+def percent_decode(name):
+  return unquote(name)
+
+
+#=====================================================================================================
+#
+# function to replace white space and %20 characters in a filename string with underscore characters
+#
+@lru_cache(maxsize = name_cache_size)
+def replace_underscore(text):
+  text = text.replace('&amp;', '&')
+  text = trailing_space_pattern.sub('', text)
+  text = whitespace_pattern.sub('_', text)
+  text = text.replace('__', '_')
+  text = text.lstrip('_')
+  text = text.replace('%20', '_')
+  text = text.replace('%27', '\'')   # some files have %27 instead of a single quote character (apostrophe)
+  return text
+
+
+#=====================================================================================================
+#
+# function to normalise a media file name for use as an inventory key
+#
+# Spaces, underscores and %20 are equivalent in file names, and MediaWiki always stores file names
+# with an upper case first letter.
+#
+@lru_cache(maxsize = name_cache_size)
+def media_key(name):
+  name = unquote(name)
+  name = name.replace('&amp;', '&')
+  name = whitespace_pattern.sub('_', name)
+  name = underscores_pattern.sub('_', name)
+  name = name.strip('_')
+  return upper_first(name)
+
+
+#=====================================================================================================
+#
+# function to return a page title as used in a page URL - "Person:Smith, John" => "Person:Smith,_John"
+#
+def url_title(title):
+  return title.replace(" ", "_")
+
+
+#=====================================================================================================
+#
+# function to replace curly apostrophes with straight ones, so that "O’Brien" matches "O'Brien"
+#
+def straight_apostrophes(text):
+  return text.replace("’", "'")